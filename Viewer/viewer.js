@@ -1,8 +1,26 @@
+// Job or chapter whose pages are shown (the server's latest job when both are missing)
+const query = new URLSearchParams(window.location.search);
+const jobId = query.get("job");
+const chapter = query.get("chapter");
+const jobQuery = jobId ? `?job=${encodeURIComponent(jobId)}` : chapter ? `?chapter=${encodeURIComponent(chapter)}` : "";
+
+const SERVER_URL = "http://localhost:5001";
+
+// Pages decoded ahead of (and behind) the reader, within a budget of decoded bitmap memory
+const PREFETCH_AHEAD = 3;
+const PREFETCH_BEHIND = 1;
+const DECODED_BUDGET_BYTES = 256 * 1024 * 1024;
+
 // Will be populated from browser storage
 let pages = [];
 let currentPage = 0;
 let zoomLevel = 1;
 
+// Server manifest entries by page name: width, height, bytes, hash
+let pageInfo = {};
+// Prefetched pages by URL: { img, bytes }
+const decodedPages = new Map();
+
 const imgElement = document.getElementById("manga-page");
 const progressBar = document.getElementById("progress-bar");
 const progressText = document.getElementById("progress-text");
@@ -14,14 +32,12 @@ const zoomOutBtn = document.getElementById("zoom-out");
 // Initialize viewer - try server first, fallback to storage
   async function init() {
       try {
-          // Try to load from server first
-          const res = await fetch("http://localhost:5001/pages");
-          const data = await res.json();
-          pages = data.pages; // ["manga_page_001.png", ...]
-
-          if (pages.length > 0) {
-              console.log(`Loaded ${pages.length} pages from server`);
-              showPage(currentPage);
+          // Try to load from server first; a job that is still running shows its pages as they arrive
+          const manifest = await fetchManifest();
+          if (manifest.pages.length > 0 || !manifest.done) {
+              console.log(`Loaded ${manifest.pages.length} pages from server`);
+              applyManifest(manifest);
+              if (!manifest.done) followNewPages(manifest.job_id);
               return;
           }
       } catch (err) {
@@ -69,11 +85,113 @@ function showPage(index) {
         imgElement.src = browser.runtime.getURL(pages[index]);
     } else {
         // サーバーのprocessed/から取得
-        imgElement.src = `http://localhost:5001/pages/${pages[index]}`;
+        imgElement.src = serverPageUrl(pages[index]);
+        prefetchAround(index);
     }
     updateProgressBar();
 }
 
+async function fetchManifest() {
+    const res = await fetch(`${SERVER_URL}/manifest${jobQuery}`);
+    if (!res.ok) throw new Error(`No manifest (${res.status})`);
+    return res.json();
+}
+
+function applyManifest(manifest) {
+    const wasEmpty = pages.length === 0;
+    pageInfo = {};
+    for (const page of manifest.pages) pageInfo[page.name] = page;
+    pages = manifest.pages.map((page) => page.name);
+
+    if (pages.length === 0) return;
+    if (wasEmpty) {
+        showPage(currentPage);
+    } else {
+        updateProgressBar();
+        prefetchAround(currentPage);
+    }
+}
+
+// Decoded size of a page at the width it is requested in
+function decodedBytes(page) {
+    const info = pageInfo[page];
+    const width = Math.min(info.width, window.innerWidth * (window.devicePixelRatio || 1) * Math.max(zoomLevel, 1));
+    return Math.ceil(width) * Math.ceil(info.height * width / info.width) * 4;
+}
+
+// Download and decode the pages around `index` so that turning to them shows them at once
+function prefetchAround(index) {
+    const nearby = [];
+    for (let i = index - PREFETCH_BEHIND; i <= index + PREFETCH_AHEAD; i++) {
+        if (i >= 0 && i < pages.length && pageInfo[pages[i]]) nearby.push(i);
+    }
+    // Nearest first, so the next page is ready before the ones after it
+    nearby.sort((a, b) => Math.abs(a - index) - Math.abs(b - index) || b - a);
+
+    const wanted = new Map(nearby.map((i) => [serverPageUrl(pages[i]), pages[i]]));
+    for (const url of decodedPages.keys()) {
+        if (!wanted.has(url)) decodedPages.delete(url);
+    }
+
+    let used = 0;
+    for (const entry of decodedPages.values()) used += entry.bytes;
+
+    for (const [url, page] of wanted) {
+        if (decodedPages.has(url)) continue;
+        const bytes = decodedBytes(page);
+        if (used + bytes > DECODED_BUDGET_BYTES) break;
+        used += bytes;
+
+        const img = new Image();
+        img.src = url;
+        decodedPages.set(url, { img, bytes });
+        img.decode().catch(() => decodedPages.delete(url));
+    }
+}
+
+// Server page URL sized for the screen; the server rounds the width up and picks WebP when the browser accepts it
+function serverPageUrl(page) {
+    const params = new URLSearchParams();
+    if (jobId) params.set("job", jobId);
+    else if (chapter) params.set("chapter", chapter);
+    const width = window.innerWidth * (window.devicePixelRatio || 1) * Math.max(zoomLevel, 1);
+    params.set("w", Math.ceil(width));
+    // The content hash changes the URL when a page is rendered again
+    if (pageInfo[page]) params.set("v", pageInfo[page].hash);
+    return `${SERVER_URL}/pages/${page}?${params}`;
+}
+
+// Reload the manifest whenever the server finishes a page, at most one request at a time
+function followNewPages(job) {
+    const events = new EventSource(`${SERVER_URL}/events?job=${encodeURIComponent(job)}`);
+    let loading = false;
+    let stale = false;
+
+    async function refresh() {
+        if (loading) {
+            stale = true;
+            return;
+        }
+        loading = true;
+        try {
+            applyManifest(await fetchManifest());
+        } catch (err) {
+            console.log("Failed to refresh manifest", err);
+        }
+        loading = false;
+        if (stale) {
+            stale = false;
+            refresh();
+        }
+    }
+
+    events.addEventListener("rendered", refresh);
+    events.addEventListener("done", () => {
+        events.close();
+        refresh();
+    });
+}
+
 function updateProgressBar() {
     const progress = ((currentPage + 1) / pages.length) * 100;
     progressBar.style.width = progress + "%";
@@ -97,6 +215,11 @@ function prevPage() {
 function zoomIn() {
     zoomLevel = Math.min(zoomLevel + 0.2, 3);
     imgElement.style.transform = `scale(${zoomLevel})`;
+    // Load a sharper copy once the scaled page outgrows the one on screen
+    if (imgElement.src.startsWith(`${SERVER_URL}/pages/`)) {
+        const url = serverPageUrl(pages[currentPage]);
+        if (imgElement.src !== url) imgElement.src = url;
+    }
 }
 
 function zoomOut() {
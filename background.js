@@ -2,8 +2,9 @@ browser.runtime.onMessage.addListener(async (message) => {
   try {
     // Check if this is an "openResult" message
     if (message.action === "openResult") {
+      const query = message.job ? `?job=${encodeURIComponent(message.job)}` : "";
       browser.tabs.create({
-        url: browser.runtime.getURL("Viewer/viewer.html")
+        url: browser.runtime.getURL("Viewer/viewer.html") + query
       });
       return;
     }
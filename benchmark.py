@@ -0,0 +1,206 @@
+"""
+End-to-end benchmark of the extraction and rendering pipeline.
+
+Usage:
+    python3 benchmark.py [--repeat 3] [--synthetic 4] [--backend eager] [--out bench.json]
+
+Runs every page of a fixed corpus (image.png, Placeholders/page*.png and generated dense
+pages) through each stage in turn and reports p50/p95 per stage plus pages/sec as JSON.
+The OCR memo and the result cache are not used, so every run measures the models.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image, ImageDraw
+
+import renderer
+from fonts import FONTS
+from metrics import METRICS
+from text_extracter import MangaTextExtractor, load_page
+
+ROOT = Path(__file__).parent
+CORPUS = [ROOT / "image.png"] + sorted((ROOT / "Placeholders").glob("page*.png"))
+
+STAGES = ("decode", "detect", "ocr_per_bubble", "background", "inpaint", "layout", "draw", "encode", "page")
+
+# Stages timed inside render_page, read from its METRICS histograms: report name -> metric stage
+RENDER_STAGES = {"background": "background", "inpaint": "inpaint", "layout": "fit_text", "draw": "draw"}
+
+# Text drawn on the synthetic pages
+SYNTHETIC_CHARS = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんアイウエオ日本語漢字！？…ー"
+
+
+def synthetic_page(path, seed, width=1800, height=2600, bubbles=40):
+    """
+    Write a reproducible page crowded with small vertical text blocks.
+    """
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(bubbles):
+        font_size = rng.choice((16, 20, 24, 28))
+        font = FONTS.get(font_size)
+        columns = rng.randint(1, 4)
+        chars = rng.randint(4, 12)
+        x = rng.randint(0, width - columns * font_size * 2)
+        y = rng.randint(0, height - chars * font_size - 40)
+        draw.ellipse(
+            [x - 20, y - 20, x + columns * font_size * 1.5 + 20, y + chars * font_size + 20],
+            outline="black", width=3
+        )
+        for column in range(columns):
+            column_x = x + (columns - 1 - column) * font_size * 1.5
+            for row in range(chars):
+                draw.text((column_x, y + row * font_size), rng.choice(SYNTHETIC_CHARS), font=font, fill="black")
+    img.save(path)
+    return path
+
+
+def percentile(values, q):
+    """Linearly interpolated percentile of `values`, q in [0, 100]"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2) if samples else None,
+        "p95_ms": round(percentile(samples, 95) * 1000, 2) if samples else None,
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2) if samples else None,
+        "total_s": round(sum(samples), 3),
+    }
+
+
+class CapturingWriter:
+    """Stands in for a PageWriter so that encoding can be timed on its own"""
+
+    def submit(self, img, path, on_written=None):
+        self.img = img
+        return None
+
+
+def measure(args, work_dir):
+    """Measure every page of the corpus; generated pages and rendered output go to `work_dir`"""
+    corpus = [p for p in CORPUS if p.exists()]
+    corpus += [synthetic_page(work_dir / f"synthetic_{i}.png", seed=i) for i in range(args.synthetic)]
+
+    extractor = MangaTextExtractor(backend=args.backend, adaptive_input=args.adaptive, ocr_memo_size=0)
+    font_path = FONTS.resolve()
+
+    samples = {stage: [] for stage in STAGES}
+    bubbles_total = 0
+    wall_time = 0.0
+
+    for run in range(args.warmup + args.repeat):
+        measuring = run >= args.warmup
+        for path in corpus:
+            page_start = time.perf_counter()
+
+            start = time.perf_counter()
+            page = load_page(path)
+            decode = time.perf_counter() - start
+
+            start = time.perf_counter()
+            # With the detector's text mask, as the server inpaints from it
+            page, boxes, text_mask = extractor.detect(page, with_mask=True)
+            detect = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = extractor.recognize([(page, boxes)])[0]
+            ocr = time.perf_counter() - start
+
+            writer = CapturingWriter()
+            before = {stage: METRICS.total("manga_stage_seconds", stage=metric) for stage, metric in RENDER_STAGES.items()}
+            # render_page logs every bubble; keep stdout for the report
+            with contextlib.redirect_stdout(sys.stderr):
+                renderer.render_page(page, results, font_path, work_dir, path.name, writer=writer, text_mask=text_mask)
+            render = {
+                stage: METRICS.total("manga_stage_seconds", stage=metric) - before[stage]
+                for stage, metric in RENDER_STAGES.items()
+            }
+
+            start = time.perf_counter()
+            renderer.OUTPUT_ENCODER.save(writer.img, work_dir / renderer.OUTPUT_ENCODER.output_name(path.name))
+            encode = time.perf_counter() - start
+
+            page_time = time.perf_counter() - page_start
+            if not measuring:
+                continue
+
+            samples["decode"].append(decode)
+            samples["detect"].append(detect)
+            if results:
+                samples["ocr_per_bubble"].append(ocr / len(results))
+            for stage, seconds in render.items():
+                samples[stage].append(seconds)
+            samples["encode"].append(encode)
+            samples["page"].append(page_time)
+            bubbles_total += len(results)
+            wall_time += page_time
+            print(f"  {path.name}: {len(results)} bubbles, {page_time * 1000:.0f} ms", file=sys.stderr)
+
+    pages = len(samples["page"])
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+        },
+        "settings": {
+            "backend": args.backend,
+            "adaptive_input": args.adaptive,
+            "output_format": renderer.OUTPUT_ENCODER.format,
+            "inpaint": renderer.INPAINTER.method if renderer.INPAINTER is not None else None,
+            "inpaint_budget": renderer.INPAINT_BUDGET,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "corpus": [p.name for p in corpus],
+        },
+        "pages": pages,
+        "bubbles": bubbles_total,
+        "pages_per_sec": round(pages / wall_time, 3) if wall_time else None,
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes before measuring")
+    parser.add_argument("--synthetic", type=int, default=4, help="Number of generated dense pages")
+    parser.add_argument("--backend", default="eager", help="Inference backend of the extractor")
+    parser.add_argument("--adaptive", action="store_true", help="Choose the detector input size per page")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="manga-bench-") as work_dir:
+        report = measure(args, Path(work_dir))
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + "\n", encoding="utf-8")
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compare an inference backend against the eager PyTorch baseline.
+
+Usage:
+    python3 check_backend.py int8 image.png [more pages...]
+
+For every page, the boxes of both extractors are matched by IoU and the texts of matched
+boxes are compared. Exits with status 1 when the agreement is below the thresholds.
+"""
+import argparse
+import difflib
+import sys
+import time
+
+from text_extracter import INFERENCE_BACKENDS, MangaTextExtractor, load_page
+
+
+def iou(a, b):
+    """Intersection over union of two (xmin, ymin, xmax, ymax) boxes"""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def run(extractor, pages):
+    """Extract every page; returns the results and the detection / OCR seconds spent"""
+    results, detect_time, ocr_time = [], 0.0, 0.0
+    for page in pages:
+        start = time.perf_counter()
+        detection = extractor.detect(page)
+        detect_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        results.append(extractor.recognize([detection])[0])
+        ocr_time += time.perf_counter() - start
+    return results, detect_time, ocr_time
+
+
+def compare(baseline, candidate, min_iou):
+    """Match the boxes of one page; returns (matched pairs, unmatched baseline, unmatched candidate)"""
+    pairs = []
+    unused = list(candidate)
+    for item in baseline:
+        best = max(unused, key=lambda c: iou(item["position"], c["position"]), default=None)
+        if best is not None and iou(item["position"], best["position"]) >= min_iou:
+            pairs.append((item, best))
+            unused.remove(best)
+    return pairs, len(baseline) - len(pairs), len(unused)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("backend", choices=[b for b in INFERENCE_BACKENDS if b != "eager"])
+    parser.add_argument("pages", nargs="+", help="Page images to compare on")
+    parser.add_argument("--min-iou", type=float, default=0.5, help="IoU for two boxes to count as the same bubble")
+    parser.add_argument("--min-box-recall", type=float, default=0.95, help="Share of baseline boxes that must be matched")
+    parser.add_argument("--min-text-similarity", type=float, default=0.9, help="Mean text similarity of matched boxes")
+    args = parser.parse_args()
+
+    pages = [load_page(path) for path in args.pages]
+
+    # The OCR memo would hide the model difference, so both extractors run without it
+    timings = {}
+    outputs = {}
+    for backend in ("eager", args.backend):
+        print(f"Running {backend}...")
+        extractor = MangaTextExtractor(backend=backend, ocr_memo_size=0)
+        outputs[backend], detect_time, ocr_time = run(extractor, pages)
+        timings[backend] = (detect_time, ocr_time)
+        del extractor
+
+    total_boxes = matched = missed = extra = exact = 0
+    similarity = 0.0
+    for path, baseline, candidate in zip(args.pages, outputs["eager"], outputs[args.backend]):
+        pairs, page_missed, page_extra = compare(baseline, candidate, args.min_iou)
+        total_boxes += len(baseline)
+        matched += len(pairs)
+        missed += page_missed
+        extra += page_extra
+        for base_item, cand_item in pairs:
+            ratio = difflib.SequenceMatcher(None, base_item["text"], cand_item["text"]).ratio()
+            similarity += ratio
+            exact += base_item["text"] == cand_item["text"]
+            if ratio < 1.0:
+                print(f"  {path} #{base_item['id']}: {base_item['text']!r} -> {cand_item['text']!r}")
+
+    box_recall = matched / total_boxes if total_boxes else 1.0
+    text_similarity = similarity / matched if matched else 1.0
+
+    print(f"\nBoxes: {matched}/{total_boxes} matched, {missed} missed, {extra} extra (recall {box_recall:.3f})")
+    print(f"Text: {exact}/{matched} identical, mean similarity {text_similarity:.3f}")
+    for backend, (detect_time, ocr_time) in timings.items():
+        bubbles = sum(len(r) for r in outputs[backend])
+        per_bubble = ocr_time / bubbles * 1000 if bubbles else 0.0
+        print(f"{backend:>6}: detect {detect_time / len(pages) * 1000:.0f} ms/page, OCR {per_bubble:.0f} ms/bubble")
+
+    if box_recall < args.min_box_recall or text_similarity < args.min_text_similarity:
+        print("FAILED: backend output differs from the eager baseline")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
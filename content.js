@@ -121,7 +121,8 @@ browser.runtime.onMessage.addListener((message) => {
     if (message.action === "openViewer") {
         // Open viewer
         browser.runtime.sendMessage({
-            action: "openResult"
+            action: "openResult",
+            job: message.job
         });
         // Close modal
         modalOverlay.classList.remove("show");
@@ -1,3 +1,5 @@
+const SERVER_URL = "http://localhost:5001";
+
 async function downloadShonenJumpPages(limit) {
 
 	const DIVIDE_NUM = 4;
@@ -16,6 +18,25 @@ async function downloadShonenJumpPages(limit) {
 	console.log(`Found ${mainPages.length} pages to download.`);
 	const actualLimit = (limit === 0 || !limit) ? mainPages.length : limit;
 
+	// The episode id names the chapter, so reopening an episode reuses its rendered pages
+	const episodeId = String(data.readableProduct.id || location.pathname.split("/").filter(Boolean).pop() || "");
+	const chapter = episodeId.replace(/[^A-Za-z0-9_-]/g, "").slice(0, 64) || undefined;
+
+	// Open an upload job; the server starts processing each page as soon as it arrives
+	const startRes = await fetch(`${SERVER_URL}/upload/start`, {
+		method: "POST",
+		headers: { "Content-Type": "application/json" },
+		// Only a complete upload lets the server drop pages that are no longer in the chapter
+		body: JSON.stringify({ num_pages: actualLimit, chapter, complete: actualLimit === mainPages.length })
+	});
+	const startResult = await startRes.json();
+	if (startResult.status !== "started") {
+		console.error("Failed to start upload:", startResult);
+		return;
+	}
+	const jobId = startResult.job_id;
+	watchProcessing(jobId);
+
 	// 2. Loop through pages sequentially
 	for (let index = 0; index < actualLimit; index++) {
 		const page = mainPages[index];
@@ -62,64 +83,75 @@ async function downloadShonenJumpPages(limit) {
 				ctx.drawImage(img, i, t, cell_width, cell_height, s, o, cell_width, cell_height);
 			}
 
-			// ダウンロード
-			const dataUrl = canvas.toDataURL("image/png");
-			const link = document.createElement('a');
-			link.download = `manga_page_${pageNum}.png`;
-			link.href = dataUrl;
-			link.click();
-
-			await new Promise(r => setTimeout(r, 300));
+			// サーバーへ直接アップロード
+			const pngBlob = await new Promise(res => canvas.toBlob(res, "image/png"));
+			const form = new FormData();
+			form.append("job", jobId);
+			form.append("page", pngBlob, `manga_page_${pageNum}.png`);
+			const uploadRes = await fetch(`${SERVER_URL}/upload/page`, { method: "POST", body: form });
+			if (!uploadRes.ok) {
+				console.error(`Upload of page ${pageNum} failed:`, await uploadRes.text());
+			}
 
 		} catch (err) {
 			console.error(`Error on page ${pageNum}:`, err);
 		}
 	}
 
-	console.log("Finished downloading all pages.");
+	console.log("Finished uploading all pages.");
+
+	// Tell the server no more pages are coming
+	try {
+		await fetch(`${SERVER_URL}/upload/finish`, {
+			method: "POST",
+			headers: { "Content-Type": "application/json" },
+			body: JSON.stringify({ job: jobId })
+		});
+	} catch (err) {
+		console.error("Failed to signal server", err);
+	}
+}
+
+// Follow processing on the server through its Server-Sent Events stream
+function watchProcessing(jobId) {
+	const events = new EventSource(`${SERVER_URL}/events?job=${jobId}`);
+	let viewerOpened = false;
 
-	// Send signal to server to start processing
-	const xhr = new XMLHttpRequest();
-	xhr.open("POST", "http://localhost:5001/run", true);
-	xhr.setRequestHeader("Content-Type", "application/json");
-	xhr.onload = () => {
-		const result = JSON.parse(xhr.responseText);
-		if (result.status === "started") {
-			pollForCompletion();
+	const openViewer = () => {
+		if (!viewerOpened) {
+			viewerOpened = true;
+			browser.runtime.sendMessage({ action: "openViewer", job: jobId });
 		}
 	};
-	xhr.onerror = () => console.error("Failed to signal server");
-	xhr.send(JSON.stringify({ num_pages: actualLimit }));
-}
 
-// Poll the server to check if processing is complete
-function pollForCompletion() {
-	const checkProgress = () => {
-		fetch("http://localhost:5001/progress")
-			.then(res => res.json())
-			.then(data => {
-				// Send progress update to UI
-				browser.runtime.sendMessage({
-					action: "PROCESSING_PROGRESS",
-					current: data.progress,
-					total: data.total
-				});
-
-				if (data.done) {
-					console.log("Processing complete! Opening viewer...");
-					browser.runtime.sendMessage({ action: "openViewer" });
-				} else {
-					// Still processing, check again in 2 seconds
-					setTimeout(checkProgress, 2000);
-				}
-			})
-			.catch(err => {
-				console.error("Failed to check progress:", err);
-				setTimeout(checkProgress, 2000);
-			});
-	};
+	events.addEventListener("rendered", (e) => {
+		const data = JSON.parse(e.data);
+
+		// Send progress update to UI
+		browser.runtime.sendMessage({
+			action: "PROCESSING_PROGRESS",
+			current: data.progress,
+			total: data.total
+		});
+
+		// The viewer picks up the remaining pages by itself, so open it with the first one
+		console.log(`Page ready: ${data.page}`);
+		openViewer();
+	});
+
+	events.addEventListener("done", (e) => {
+		const data = JSON.parse(e.data);
+		if (data.status === "failed") {
+			console.error("Processing failed:", data.error);
+		} else {
+			console.log("Processing complete!");
+		}
+		events.close();
+		openViewer();
+	});
 
-	checkProgress();
+	// EventSource reconnects by itself after network errors
+	events.onerror = (err) => console.error("Progress stream error:", err);
 }
 
 // Make it globally available
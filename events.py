@@ -0,0 +1,86 @@
+import json
+import queue
+import threading
+from collections import OrderedDict
+
+
+class EventBroker:
+    def __init__(self, max_pending=256, max_jobs=16):
+        """
+        Fan out processing events to Server-Sent Events subscribers.
+
+        Every event belongs to a job. The events of the most recent jobs are kept and
+        replayed to new subscribers, so a viewer that connects halfway through a job still
+        learns about the pages that are already done.
+
+        Args:
+            max_pending (int): Events buffered per subscriber; a subscriber that falls further behind loses events.
+            max_jobs (int): Number of jobs whose event history is kept.
+        """
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self._subscribers = {}
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, event, job, **data):
+        """
+        Send an event of `job` to every interested subscriber without blocking the caller.
+        """
+        data["job_id"] = job
+        message = (event, data)
+        with self._lock:
+            history = self._history.setdefault(job, [])
+            self._history.move_to_end(job)
+            while len(self._history) > self.max_jobs:
+                self._history.popitem(last=False)
+            history.append(message)
+
+            for subscriber, job_filter in self._subscribers.items():
+                if job_filter is not None and job_filter != job:
+                    continue
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def subscribe(self, job=None):
+        """
+        Subscribe to the events of `job`, or of every job when None.
+
+        The history of `job` (or of the most recently active job) is queued first.
+        """
+        with self._lock:
+            if job is None:
+                history = next(reversed(self._history.values()), [])
+            else:
+                history = self._history.get(job, [])
+            subscriber = queue.Queue(maxsize=self.max_pending + len(history))
+            for message in history:
+                subscriber.put_nowait(message)
+            self._subscribers[subscriber] = job
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def stream(self, job=None, heartbeat=15):
+        """
+        Generator of text/event-stream chunks for one client.
+
+        Args:
+            job (str, optional): Only stream the events of this job.
+            heartbeat (float): Seconds between keep-alive comments while no event is sent.
+        """
+        subscriber = self.subscribe(job)
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
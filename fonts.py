@@ -0,0 +1,160 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+# Japanese-capable fonts tried in order (macOS, then common Linux and Windows locations).
+# Paths listed in the MANGA_FONT_PATHS environment variable (os.pathsep separated) are tried first.
+DEFAULT_FONT_CHAIN = [
+    "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "C:/Windows/Fonts/msgothic.ttc",
+]
+
+# Sizes loaded at server startup
+WARM_FONT_SIZES = range(10, 101, 2)
+
+
+class GlyphMetrics:
+    def __init__(self, max_entries=200000):
+        """
+        Cache of per-character bounding boxes keyed by (font_path, size, char).
+
+        Layout code asks for the size of the same characters over and over, once per
+        candidate font size and again while drawing. Looking them up here turns that into
+        dictionary reads instead of a FreeType call each time.
+
+        Args:
+            max_entries (int): The table is cleared once it holds more boxes than this.
+        """
+        self.max_entries = max_entries
+        self._boxes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _font_key(font):
+        # Bitmap fonts from ImageFont.load_default() have no path
+        return getattr(font, "path", id(font)), font.size, getattr(font, "index", 0)
+
+    def warm(self, font, chars):
+        """
+        Measure every character of `chars` that is not cached yet for this font.
+        """
+        font_key = self._font_key(font)
+        missing = [c for c in set(chars) if (font_key, c) not in self._boxes]
+        if not missing:
+            return
+
+        # Same box as draw.textbbox((0, 0), c, font=font) on an RGB image
+        measured = {(font_key, c): font.getbbox(c) for c in missing}
+        with self._lock:
+            if len(self._boxes) + len(measured) > self.max_entries:
+                self._boxes.clear()
+            self._boxes.update(measured)
+
+    def bbox(self, font, char):
+        box = self._boxes.get((self._font_key(font), char))
+        if box is None:
+            self.warm(font, char)
+            box = self._boxes.get((self._font_key(font), char)) or font.getbbox(char)
+        return box
+
+    def width(self, font, char):
+        box = self.bbox(font, char)
+        return box[2] - box[0]
+
+    def height(self, font, char):
+        box = self.bbox(font, char)
+        return box[3] - box[1]
+
+
+class FontRegistry:
+    def __init__(self, font_paths=None, max_fonts=256):
+        """
+        Process-wide cache of loaded fonts keyed by (path, size, index).
+
+        Args:
+            font_paths (list[str], optional): Fallback chain of font files. Defaults to MANGA_FONT_PATHS
+                                              followed by DEFAULT_FONT_CHAIN.
+            max_fonts (int): Maximum number of loaded fonts kept; the least recently used is dropped first.
+        """
+        if font_paths is None:
+            env_paths = os.environ.get("MANGA_FONT_PATHS", "")
+            font_paths = [p for p in env_paths.split(os.pathsep) if p] + DEFAULT_FONT_CHAIN
+        self.font_paths = list(font_paths)
+        self.max_fonts = max_fonts
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+        self._resolved = False
+        self._default_path = None
+
+    def resolve(self):
+        """
+        Return the first font in the fallback chain that can be loaded, or None if none can.
+        """
+        with self._lock:
+            if not self._resolved:
+                for path in self.font_paths:
+                    try:
+                        ImageFont.truetype(path, 20)
+                    except OSError:
+                        continue
+                    self._default_path = path
+                    break
+                else:
+                    print(f"No font from the fallback chain could be loaded: {self.font_paths}")
+                self._resolved = True
+            return self._default_path
+
+    def get(self, size, path=None, index=0):
+        """
+        Return the font at `size`, loading it only the first time it is requested.
+
+        Args:
+            size (float): Font size in pixels.
+            path (str, optional): Font file. Defaults to the first loadable font of the chain.
+            index (int): Face index inside a .ttc collection.
+
+        Raises:
+            OSError: If an explicitly given `path` cannot be loaded.
+        """
+        if path is None:
+            path = self.resolve()
+            if path is None:
+                return ImageFont.load_default(size)
+
+        key = (path, size, index)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                return font
+
+        font = ImageFont.truetype(path, size, index=index)
+
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+        return font
+
+    def warm(self, sizes=WARM_FONT_SIZES):
+        """
+        Load the default font at the given sizes ahead of time.
+        """
+        path = self.resolve()
+        if path is None:
+            return
+        for size in sizes:
+            self.get(size, path)
+
+
+# Shared by all layout functions and pages
+GLYPH_METRICS = GlyphMetrics()
+FONTS = FontRegistry()
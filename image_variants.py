@@ -0,0 +1,178 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+# Encodings a page can be served in, by preference when the client accepts several.
+# AVIF encodes much slower than WebP, so it is only used when asked for explicitly.
+FORMATS = {
+    "webp": ("image/webp", "WEBP", {"lossless": True, "method": 4}),
+    "png": ("image/png", "PNG", {}),
+    "avif": ("image/avif", "AVIF", {"quality": 80}),
+    "jpeg": ("image/jpeg", "JPEG", {"quality": 90}),
+}
+NEGOTIATED_FORMATS = ("webp", "png")
+
+# Pages already in a lossy format are served in it: re-encoding them losslessly only makes them larger
+LOSSY_SUFFIXES = {".jpg": "jpeg", ".jpeg": "jpeg"}
+
+# Widths served for downscaled requests; other widths are rounded up to one of these so the
+# number of cached variants per page stays small
+VARIANT_WIDTHS = (480, 800, 1200, 1600)
+
+
+def format_supported(fmt):
+    Image.init()
+    return FORMATS[fmt][1] in Image.SAVE
+
+
+def pick_format(requested, accept_header, source=None):
+    """
+    Choose the encoding for a response.
+
+    Args:
+        requested (str, optional): Format named in the query string; wins when it is supported.
+        accept_header (str): The request's Accept header.
+        source (str or Path, optional): The page being served; a lossy page keeps its own format.
+
+    Returns:
+        str: A key of FORMATS.
+    """
+    if requested in FORMATS and format_supported(requested):
+        return requested
+    if source is not None and Path(source).suffix.lower() in LOSSY_SUFFIXES:
+        return LOSSY_SUFFIXES[Path(source).suffix.lower()]
+    accept = accept_header or ""
+    for fmt in NEGOTIATED_FORMATS:
+        if FORMATS[fmt][0] in accept and format_supported(fmt):
+            return fmt
+    return "png"
+
+
+def pick_width(requested):
+    """Round a requested width up to the nearest VARIANT_WIDTHS entry; None keeps the full size"""
+    if not requested:
+        return None
+    for width in VARIANT_WIDTHS:
+        if requested <= width:
+            return width
+    return None
+
+
+class VariantStore:
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        """
+        On-disk cache of re-encoded and downscaled versions of rendered pages.
+
+        A variant is named after the source file's path, size and modification time plus the
+        requested format and width, so a page that is rendered again gets fresh variants and the
+        name doubles as a strong ETag. Serving a variant refreshes its modification time, and once
+        the directory grows past `max_bytes` the least recently used variants are deleted.
+
+        Args:
+            cache_dir (str or Path): Directory holding the variants.
+            max_bytes (int): Size cap for the whole cache directory.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # etag -> [threading.Event, encoding error or None]
+        self._in_progress = {}
+
+    @staticmethod
+    def etag(source, fmt, width):
+        """Identity of one variant of `source` in its current version"""
+        stat = Path(source).stat()
+        key = f"{Path(source).resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{fmt}|{width}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    def get(self, source, fmt, width=None):
+        """
+        Return (path, etag) of the variant, encoding it on first request.
+
+        The original file is returned as is when it already has the format and no smaller width is asked for.
+        Concurrent requests for the same missing variant encode it only once; if that encoding fails,
+        every one of them raises its error.
+        """
+        etag = self.etag(source, fmt, width)
+        suffix = Path(source).suffix.lower()
+        if width is None and (suffix == f".{fmt}" or LOSSY_SUFFIXES.get(suffix) == fmt):
+            return Path(source), etag
+
+        path = self.cache_dir / f"{etag}.{fmt}"
+        with self._lock:
+            try:
+                # Mark as recently used
+                os.utime(path)
+                return path, etag
+            except FileNotFoundError:
+                pass
+
+            entry = self._in_progress.get(etag)
+            owner = entry is None
+            if owner:
+                entry = self._in_progress[etag] = [threading.Event(), None]
+
+        if not owner:
+            entry[0].wait()
+            if entry[1] is not None:
+                raise entry[1]
+            return path, etag
+
+        try:
+            self._encode(source, path, fmt, width)
+        except Exception as e:
+            entry[1] = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_progress[etag]
+                if entry[1] is None:
+                    self._evict()
+            entry[0].set()
+        return path, etag
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for path in self.cache_dir.iterdir():
+            if path.suffix == ".tmp":
+                # Still being encoded
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        # Oldest first
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    @staticmethod
+    def _encode(source, path, fmt, width):
+        with Image.open(source) as img:
+            img = img.convert("RGB")
+            if width is not None and width < img.width:
+                height = round(img.height * width / img.width)
+                img = img.resize((width, height), Image.LANCZOS)
+
+            _, pil_format, options = FORMATS[fmt]
+            tmp_path = path.with_name(path.name + ".tmp")
+            img.save(tmp_path, format=pil_format, **options)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
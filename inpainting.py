@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from metrics import METRICS
+
+# OpenCV inpainting methods by name
+INPAINT_METHODS = {"telea": cv2.INPAINT_TELEA, "ns": cv2.INPAINT_NS}
+
+
+class Inpainter:
+    def __init__(self, workers=4, radius=3, dilate=2, budget=0.5, method="telea", max_crop_pixels=1_500_000):
+        """
+        Remove the original lettering of a page by inpainting only the masked pixels of each bubble.
+
+        Every bubble is inpainted on its own small crop, on a shared thread pool (OpenCV releases
+        the GIL), so the cost follows the amount of text rather than the page size. Each page gets
+        a time budget; bubbles not finished within it are reported as not inpainted and the caller
+        falls back to filling them.
+
+        At most `workers` bubbles are in flight at a time, across all pages, and a bubble is only
+        started before its page's deadline. A page that runs over its budget therefore leaves at
+        most one bubble per thread behind, never a queue in front of the next page.
+
+        Args:
+            workers (int): Threads inpainting bubbles, shared by all pages.
+            radius (int): Neighbourhood radius considered by the inpainting method.
+            dilate (int): Pixels the text mask is grown by, to cover anti-aliased stroke edges.
+            budget (float): Seconds a page may spend waiting for its bubbles.
+            method (str): A key of INPAINT_METHODS.
+            max_crop_pixels (int): Bubbles whose crop is larger than this are left to the fallback, which
+                                   bounds the time a single bubble can take.
+        """
+        if method not in INPAINT_METHODS:
+            raise ValueError(f"method must be one of {tuple(INPAINT_METHODS)}, got {method!r}")
+        self.radius = radius
+        self.budget = budget
+        self.method = method
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * dilate + 1, 2 * dilate + 1)) if dilate > 0 else None
+        self.max_crop_pixels = max_crop_pixels
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inpaint")
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def inpaint(self, page, positions, mask):
+        """
+        Inpaint the text of every bubble in place.
+
+        Args:
+            page (numpy.ndarray): Page of shape (height, width, 3), uint8; modified in place.
+            positions (list[tuple]): (xmin, ymin, xmax, ymax) of each bubble. Only mask pixels inside
+                                     these boxes are inpainted.
+            mask (numpy.ndarray): Page-sized text mask, non-zero on text.
+
+        Returns:
+            set[int]: Indices of the bubbles that were inpainted within the budget.
+        """
+        deadline = time.monotonic() + self.budget
+        futures = {}
+        for i, position in enumerate(positions):
+            # Wait for a free thread, but never past the deadline
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                break
+            try:
+                future = self._executor.submit(self._run, page, position, mask, deadline)
+            except Exception:
+                self._slots.release()
+                raise
+            # Done callbacks also run on cancel, so a bubble that never started gives its slot back too
+            future.add_done_callback(self._release_slot)
+            futures[future] = i
+
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for future in not_done:
+            # Running bubbles can't be stopped; they finish on their thread and are discarded
+            future.cancel()
+
+        inpainted = set()
+        for future in done:
+            if future.exception() is not None:
+                print(f"  [WARN] Inpainting failed: {future.exception()}")
+                continue
+            result = future.result()
+            if not result:
+                # Started too late, too large, or the mask missed the lettering; the caller
+                # fills this bubble instead
+                continue
+            (x0, y0), patch, bubble_mask = result
+            region = page[y0:y0 + patch.shape[0], x0:x0 + patch.shape[1]]
+            # Only the masked pixels are copied back, so overlapping crops don't undo each other
+            region[bubble_mask > 0] = patch[bubble_mask > 0]
+            inpainted.add(futures[future])
+
+        METRICS.inc("manga_inpaint_bubbles_total", len(inpainted), result="inpainted")
+        if len(inpainted) < len(positions):
+            METRICS.inc("manga_inpaint_bubbles_total", len(positions) - len(inpainted), result="skipped")
+        return inpainted
+
+    def _run(self, page, position, mask, deadline):
+        """Inpaint one bubble unless its page's deadline has passed (then returns False)"""
+        if time.monotonic() > deadline:
+            return False
+        return self._inpaint_bubble(page, position, mask)
+
+    def _release_slot(self, future):
+        self._slots.release()
+
+    def _inpaint_bubble(self, page, position, mask):
+        """
+        Inpaint one bubble on a crop around it.
+
+        Returns (origin, patch, mask), None when the mask has no pixels in the bubble, or False when it is too large.
+        """
+        height, width = page.shape[:2]
+        xmin, ymin, xmax, ymax = position
+        xmin, xmax = max(0, xmin), min(width, xmax)
+        ymin, ymax = max(0, ymin), min(height, ymax)
+        if xmax <= xmin or ymax <= ymin:
+            return None
+
+        # The margin gives the method surrounding pixels to inpaint from
+        margin = self.radius + (self._kernel.shape[0] if self._kernel is not None else 0)
+        x0, y0 = max(0, xmin - margin), max(0, ymin - margin)
+        x1, y1 = min(width, xmax + margin), min(height, ymax + margin)
+        if (x1 - x0) * (y1 - y0) > self.max_crop_pixels:
+            return False
+
+        bubble_mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        bubble_mask[ymin - y0:ymax - y0, xmin - x0:xmax - x0] = mask[ymin:ymax, xmin:xmax]
+        if not bubble_mask.any():
+            return None
+        if self._kernel is not None:
+            bubble_mask = cv2.dilate(bubble_mask, self._kernel)
+
+        patch = cv2.inpaint(page[y0:y1, x0:x1], bubble_mask, self.radius, INPAINT_METHODS[self.method])
+        return (x0, y0), patch, bubble_mask
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,230 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be admitted."""
+
+
+class JobConflict(Exception):
+    """Raised when another active job already writes to the same output directory."""
+
+
+class Job:
+    def __init__(self, total, output_root, chapter=None, pages=None, upload_queue_size=8, idle_timeout=120,
+                 complete=False):
+        """
+        One processing request with its own status, output directory and results.
+
+        Args:
+            total (int): Number of pages expected.
+            output_root (str or Path): The rendered pages go to output_root/<chapter>, or output_root/<job id>
+                                       when no chapter is given.
+            chapter (str, optional): Name of the chapter, shared by jobs that reprocess it.
+            pages (list, optional): Page files to process. When None, the pages are uploaded
+                                    later through `add_page` / `finish_upload`.
+            upload_queue_size (int): Uploaded pages allowed to wait for the pipeline.
+            idle_timeout (float): Seconds an upload job may go without a new page (or, for the uploader,
+                                  without room in the queue) before it fails.
+            complete (bool): Whether the pages are the whole chapter. Only then are pages rendered
+                             earlier but missing from this job removed from the chapter.
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.total = total
+        self.chapter = chapter
+        self.output_dir = Path(output_root) / (chapter or self.id)
+        self.pages = pages
+        self.upload_queue = queue.Queue(maxsize=upload_queue_size) if pages is None else None
+        self.idle_timeout = idle_timeout
+        self.complete = complete
+        self.status = "queued"
+        self.progress = 0
+        self.results = {}
+        self.error = None
+        self.created_at = time.time()
+        self._cancel_event = threading.Event()
+
+    @property
+    def is_active(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def cancel_event(self):
+        return self._cancel_event
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self.status == "queued":
+            self.status = "cancelled"
+
+    def fail(self, error):
+        """Mark the job as failed and stop its pipeline"""
+        self.error = error
+        self.status = "failed"
+        self._cancel_event.set()
+
+    def add_page(self, page):
+        """
+        Queue an uploaded page; blocks while the pipeline is busy, which throttles the uploader.
+
+        Returns:
+            bool: False if the job was cancelled, failed or finished before the page could be queued.
+        """
+        deadline = time.monotonic() + self.idle_timeout
+        while self.is_active and not self.cancelled:
+            try:
+                self.upload_queue.put(page, timeout=0.5)
+                return True
+            except queue.Full:
+                # Only a running job drains the queue; a queued one is still waiting for a worker
+                if self.status == "running" and time.monotonic() > deadline:
+                    self.fail(f"Pipeline took no page for {self.idle_timeout}s")
+                    return False
+        return False
+
+    def finish_upload(self):
+        # None marks the end of the upload
+        return self.add_page(None)
+
+    def iter_pages(self):
+        """
+        Pages in processing order. For upload jobs this yields pages as they arrive.
+        """
+        if self.pages is not None:
+            yield from self.pages
+            return
+
+        deadline = time.monotonic() + self.idle_timeout
+        while self.is_active and not self.cancelled:
+            try:
+                page = self.upload_queue.get(timeout=0.5)
+            except queue.Empty:
+                if time.monotonic() > deadline:
+                    # The uploader went away without finishing the upload
+                    self.fail(f"No page uploaded for {self.idle_timeout}s")
+                    return
+                continue
+            if page is None:
+                return
+            yield page
+            deadline = time.monotonic() + self.idle_timeout
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "total": self.total,
+            "chapter": self.chapter,
+            "is_processing": self.status == "running",
+            "done": not self.is_active,
+            "output_dir": str(self.output_dir),
+            "error": self.error,
+        }
+
+
+class JobManager:
+    def __init__(self, run_job, workers=2, max_queued=4, max_finished=32, on_discard=None, on_finish=None):
+        """
+        Bounded job queue served by a fixed pool of worker threads.
+
+        Args:
+            run_job (callable): run_job(job) processes one job; the loaded models are shared between calls.
+            workers (int): Number of jobs processed at the same time.
+            max_queued (int): Jobs allowed to wait for a worker; further submissions are rejected.
+            max_finished (int): Finished jobs kept for status and result queries.
+            on_discard (callable, optional): Called with each finished job dropped from the records,
+                                             to clean up what it left behind.
+            on_finish (callable, optional): Called with each job once it has stopped, whether it completed,
+                                            failed or was cancelled before it started.
+        """
+        self._run_job = run_job
+        self._on_discard = on_discard
+        self._on_finish = on_finish
+        self._queue = queue.Queue(maxsize=max_queued)
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, job):
+        """
+        Admit a job to the queue.
+
+        Raises:
+            JobConflict: If an active job writes to the same output directory.
+            JobQueueFull: If the queue is full.
+        """
+        with self._lock:
+            for other in self._jobs.values():
+                if other.is_active and other.output_dir == job.output_dir:
+                    raise JobConflict(f"Job {other.id} is already writing to {job.output_dir}")
+
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull(f"{self._queue.maxsize} job(s) already waiting")
+
+            self._jobs[job.id] = job
+            discarded = self._prune()
+
+        if self._on_discard is not None:
+            for old_job in discarded:
+                self._on_discard(old_job)
+        return job
+
+    def get(self, job_id=None):
+        """
+        Return the job with `job_id`, or the most recently submitted job when `job_id` is None.
+        """
+        with self._lock:
+            if job_id is None:
+                return next(reversed(self._jobs.values()), None)
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.is_active]
+        return [self._jobs.pop(job_id) for job_id in finished[:max(0, len(finished) - self.max_finished)]]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job.cancelled:
+                job.status = "cancelled"
+            else:
+                job.status = "running"
+                try:
+                    self._run_job(job)
+                    # A job that failed while running (upload timeout) keeps its status
+                    if job.status == "running":
+                        job.status = "cancelled" if job.cancelled else "done"
+                except Exception as e:
+                    print(f"  [ERROR] Job {job.id}: {e}")
+                    traceback.print_exc()
+                    job.error = str(e)
+                    job.status = "failed"
+
+            if self._on_finish is not None:
+                try:
+                    self._on_finish(job)
+                except Exception as e:
+                    print(f"  [ERROR] Job {job.id}: {e}")
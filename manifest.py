@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import sidecar
+
+MANIFEST_NAME = "manifest.json"
+
+
+def digest(data):
+    """Content hash of page bytes or of a settings dict"""
+    if isinstance(data, dict):
+        data = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ChapterManifest:
+    def __init__(self, output_dir):
+        """
+        Record of the pages already rendered into a chapter's output directory.
+
+        For every page it keeps the hash of the input image, the hash of the settings it was
+        rendered with, the rendered file and a sidecar with its extraction results. A page whose
+        input and settings are unchanged and whose files still exist does not need processing again.
+
+        The manifest is rewritten after every page, so a run that stops halfway (crash,
+        cancellation) resumes where it left off.
+
+        Args:
+            output_dir (str or Path): Chapter output directory; the manifest is stored in it.
+        """
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.pages = json.load(f).get("pages", {})
+        except (OSError, ValueError):
+            self.pages = {}
+
+    def is_current(self, name, input_hash, settings_hash):
+        """
+        Whether page `name` was rendered from the same input with the same settings and its files are intact.
+        """
+        entry = self.pages.get(name)
+        return (
+            entry is not None
+            and entry["input"] == input_hash
+            and entry["settings"] == settings_hash
+            and (self.output_dir / entry["output"]).exists()
+            and (self.output_dir / entry["results"]).exists()
+        )
+
+    def results(self, name):
+        """Extraction results stored for page `name`"""
+        return sidecar.read(self.output_dir / self.pages[name]["results"])
+
+    def record(self, name, input_hash, settings_hash, output_name, results):
+        """
+        Store the results of a freshly rendered page and save the manifest.
+        """
+        results_name = Path(output_name).stem + sidecar.SIDECAR_SUFFIX
+        sidecar.write(self.output_dir / results_name, results)
+        with self._lock:
+            self.pages[name] = {
+                "input": input_hash,
+                "settings": settings_hash,
+                "output": output_name,
+                "results": results_name,
+            }
+            self._save()
+
+    def prune(self, keep):
+        """
+        Forget the pages not in `keep` and delete their files.
+
+        Returns:
+            list[str]: Names of the removed pages.
+        """
+        with self._lock:
+            removed = [name for name in self.pages if name not in keep]
+            for name in removed:
+                entry = self.pages.pop(name)
+                for file_name in (entry["output"], entry["results"]):
+                    (self.output_dir / file_name).unlink(missing_ok=True)
+            if removed:
+                self._save()
+        return removed
+
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "pages": self.pages}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Upper bounds of the bubbles-per-page histogram buckets
+BUBBLE_BUCKETS = (0, 1, 2, 5, 10, 20, 40, 80)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Process-wide counters, histograms and gauges, rendered in the Prometheus text format.
+
+        Metrics are declared once with `describe`; every update names the metric and its labels.
+        """
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._queues = {}
+
+    def describe(self, name, kind, help_text, buckets=None, gauge=None):
+        """
+        Declare a metric.
+
+        Args:
+            name (str): Metric name.
+            kind (str): "counter", "histogram" or "gauge".
+            help_text (str): Description shown in /metrics.
+            buckets (tuple, optional): Bucket upper bounds of a histogram.
+            gauge (callable, optional): For gauges, returns {labels dict as tuple of pairs: value} when scraped.
+        """
+        self._meta[name] = (kind, help_text, buckets)
+        if gauge is not None:
+            self._gauges[name] = gauge
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = self._meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def total(self, name, **labels):
+        """Sum of the values observed in one histogram series so far"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            return entry[1] if entry is not None else 0.0
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the duration of the `with` block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def track_queues(self, owner, queues):
+        """Report the depth of `queues` ({stage: queue.Queue}) until `untrack_queues(owner)`"""
+        with self._lock:
+            self._queues[id(owner)] = queues
+
+    def untrack_queues(self, owner):
+        with self._lock:
+            self._queues.pop(id(owner), None)
+
+    def queue_depths(self):
+        """Pages waiting in front of each pipeline stage, summed over all running pipelines"""
+        depths = {}
+        with self._lock:
+            for queues in self._queues.values():
+                for stage, q in queues.items():
+                    depths[stage] = depths.get(stage, 0) + q.qsize()
+        return {(("stage", stage),): depth for stage, depth in depths.items()}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(c), s, n) for key, (c, s, n) in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            if kind == "counter":
+                for (metric, labels), value in counters.items():
+                    if metric == name:
+                        lines.append(f"{name}{_label_text(labels)} {value}")
+            elif kind == "histogram":
+                for (metric, labels), (counts, total, count) in histograms.items():
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {total}")
+                    lines.append(f"{name}_count{_label_text(labels)} {count}")
+            elif name in self._gauges:
+                for labels, value in self._gauges[name]().items():
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class TraceLog:
+    def __init__(self, path):
+        """
+        Append-only JSON Lines file of per-page trace records.
+
+        Args:
+            path (str or Path): File the records are appended to.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+METRICS = Metrics()
+METRICS.describe("manga_stage_seconds", "histogram", "Time spent in each processing stage", buckets=LATENCY_BUCKETS)
+METRICS.describe("manga_page_bubbles", "histogram", "Text bubbles found per page", buckets=BUBBLE_BUCKETS)
+METRICS.describe("manga_pages_total", "counter", "Pages finished, by outcome (rendered, skipped, failed)")
+METRICS.describe("manga_result_cache_total", "counter", "Result cache lookups, by result (hit, miss)")
+METRICS.describe("manga_ocr_memo_total", "counter", "OCR memo lookups, by result (hit, miss)")
+METRICS.describe("manga_ocr_crops_total", "counter", "Bubble crops sent to the OCR model")
+METRICS.describe("manga_inpaint_bubbles_total", "counter", "Bubbles given to the inpainter, by result (inpainted, skipped: over budget or too large)")
+METRICS.describe("manga_queue_depth", "gauge", "Pages waiting in front of each pipeline stage", gauge=METRICS.queue_depths)
@@ -0,0 +1,101 @@
+import math
+import threading
+from collections import OrderedDict
+
+import PIL.Image
+
+# Fingerprint resolution: a (HASH_SIZE + 1) x HASH_SIZE grayscale thumbnail gives HASH_SIZE**2 difference bits
+HASH_SIZE = 16
+
+
+def crop_fingerprint(crop):
+    """
+    Compute a normalized fingerprint of a bubble crop.
+
+    The crop is reduced to a small grayscale thumbnail and encoded as a difference hash
+    (one bit per horizontally adjacent pixel pair), which ignores overall brightness and
+    scale. The aspect ratio is kept separately so that crops of very different shapes
+    never match.
+
+    Args:
+        crop (PIL.Image): Cropped bubble image.
+
+    Returns:
+        tuple: (aspect_bucket, hash_bits)
+    """
+    width, height = crop.size
+    aspect_bucket = round(math.log2(max(width, 1) / max(height, 1)) * 4)
+
+    thumb = crop.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), PIL.Image.BILINEAR)
+    pixels = list(thumb.getdata())
+
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+
+    return aspect_bucket, bits
+
+
+class OcrMemo:
+    def __init__(self, max_entries=2048, max_distance=8):
+        """
+        Bounded LRU mapping bubble fingerprints to recognized text.
+
+        Args:
+            max_entries (int): Maximum number of remembered crops.
+            max_distance (int): Largest number of differing fingerprint bits (out of HASH_SIZE**2)
+                                for two crops to count as the same bubble. 0 only reuses exact matches.
+        """
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint):
+        """
+        Return the text of the closest remembered crop, or None on a miss.
+        """
+        with self._lock:
+            key = fingerprint
+            if key not in self._entries:
+                # Without fuzzy matching an exact miss is a miss
+                key = self._find_similar(fingerprint) if self.max_distance > 0 else None
+
+            if key is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, fingerprint, text):
+        with self._lock:
+            self._entries[fingerprint] = text
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Return hit/miss counters and the current number of entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _find_similar(self, fingerprint):
+        aspect_bucket, bits = fingerprint
+        best_key = None
+        best_distance = self.max_distance + 1
+        for key in self._entries:
+            if key[0] != aspect_bucket:
+                continue
+            distance = (key[1] ^ bits).bit_count()
+            if distance < best_distance:
+                best_key = key
+                best_distance = distance
+        return best_key
@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+import PIL.Image
+
+# Page decoding and cropping only need OpenCV and Pillow, so the server can use them
+# without importing the models
+
+# Side of the square every bubble is resampled to for background estimation
+BACKGROUND_SAMPLE_SIZE = 48
+
+# A sample pixel further than this from the bubble's median colour (in any channel) counts as text
+TEXT_CONTRAST = 64
+
+
+def load_page(source):
+    """
+    Decode a page once into the array shared by detection, OCR cropping and rendering.
+
+    The array is kept in BGR order because that is what the detector consumes; OCR only
+    needs grayscale crops, so the page is never converted as a whole for it.
+
+    Args:
+        source (str, Path, bytes, PIL.Image or numpy.ndarray): Image file, encoded image bytes,
+                                                               decoded image, or an already loaded BGR array.
+
+    Returns:
+        numpy.ndarray: Page of shape (height, width, 3), uint8, BGR.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, PIL.Image.Image):
+        return cv2.cvtColor(np.asarray(source.convert("RGB")), cv2.COLOR_RGB2BGR)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Image data could not be decoded")
+        return img
+
+    img = cv2.imread(str(source), cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Image not found: {source}")
+    return img
+
+
+def crop_bubble(page, position):
+    """
+    Grayscale crop of one bubble, as manga-ocr reads it.
+
+    The crop is taken as a view of the page array, so only the bubble itself is converted.
+
+    Args:
+        page (numpy.ndarray): BGR page from `load_page`.
+        position (tuple): (xmin, ymin, xmax, ymax), clipped to the page.
+
+    Returns:
+        PIL.Image: Crop in mode "L".
+    """
+    height, width = page.shape[:2]
+    xmin, ymin, xmax, ymax = position
+    xmin, xmax = max(0, xmin), min(width, xmax)
+    ymin, ymax = max(0, ymin), min(height, ymax)
+    region = page[ymin:max(ymin + 1, ymax), xmin:max(xmin + 1, xmax)]
+    return PIL.Image.fromarray(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY))
+
+
+def text_density(page, thumb_size=256):
+    """
+    Cheap estimate of how much fine detail (mostly lettering) a page has.
+
+    Args:
+        page (numpy.ndarray): BGR page from `load_page`.
+        thumb_size (int): Longest side of the thumbnail the edges are counted on.
+
+    Returns:
+        float: Share of edge pixels in the thumbnail, between 0 and 1.
+    """
+    height, width = page.shape[:2]
+    scale = thumb_size / max(height, width)
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    edges = cv2.Canny(thumb, 100, 200)
+    return np.count_nonzero(edges) / edges.size
+
+
+def bubble_backgrounds(page, positions, sample_size=BACKGROUND_SAMPLE_SIZE):
+    """
+    Background colour and text mask of every bubble of a page, estimated together.
+
+    Each bubble is resampled to a `sample_size` square so that all of them stack into one array.
+    The first estimate of the background is the median colour of each square; pixels far from it
+    form the text mask, and the background is the median of the remaining pixels.
+
+    Args:
+        page (numpy.ndarray): Page of shape (height, width, 3), uint8, in any channel order.
+        positions (list[tuple]): (xmin, ymin, xmax, ymax) of each bubble, clipped to the page.
+        sample_size (int): Side of the resampled squares.
+
+    Returns:
+        tuple: (backgrounds, text_masks) — numpy.ndarray of shape (n, 3), uint8, in the channel
+               order of `page`, and a bool array of shape (n, sample_size, sample_size).
+    """
+    count = len(positions)
+    if count == 0:
+        return np.empty((0, 3), np.uint8), np.empty((0, sample_size, sample_size), bool)
+
+    height, width = page.shape[:2]
+    samples = np.empty((count, sample_size, sample_size, 3), np.uint8)
+    for i, (xmin, ymin, xmax, ymax) in enumerate(positions):
+        xmin, xmax = max(0, xmin), min(width, xmax)
+        ymin, ymax = max(0, ymin), min(height, ymax)
+        region = page[ymin:max(ymin + 1, ymax), xmin:max(xmin + 1, xmax)]
+        samples[i] = cv2.resize(region, (sample_size, sample_size), interpolation=cv2.INTER_AREA)
+
+    pixels = samples.reshape(count, -1, 3).astype(np.int16)
+    first = np.median(pixels, axis=1)
+    text_masks = np.abs(pixels - first[:, None, :]).max(axis=2) > TEXT_CONTRAST
+
+    # Median of the background pixels only: text pixels sort last, and each row's median is
+    # taken among its own number of background pixels
+    background = np.where(text_masks[..., None], np.iinfo(np.int16).max, pixels)
+    background.sort(axis=1)
+    counts = np.count_nonzero(~text_masks, axis=1)
+    medians = background[np.arange(count), np.maximum(counts - 1, 0) // 2]
+    backgrounds = np.where(counts[:, None] > 0, medians, first).astype(np.uint8)
+
+    return backgrounds, text_masks.reshape(count, sample_size, sample_size)
+
+
+def text_mask_from_lines(page, lines, backgrounds, contrast=TEXT_CONTRAST):
+    """
+    Approximate text mask for pages without one from the detector (cached or pool-extracted results).
+
+    Pixels inside a bubble's line polygons that are far from its background colour count as text.
+
+    Args:
+        page (numpy.ndarray): Page of shape (height, width, 3), uint8.
+        lines (list): Line polygons of each bubble, as in the `lines` field of the results.
+        backgrounds (numpy.ndarray): Background colour of each bubble from `bubble_backgrounds`,
+                                     in the channel order of `page`.
+        contrast (int): Minimum channel difference from the background for a text pixel.
+
+    Returns:
+        numpy.ndarray: Page-sized mask, uint8, 255 on text.
+    """
+    height, width = page.shape[:2]
+    mask = np.zeros((height, width), np.uint8)
+    for polygons, background in zip(lines, backgrounds):
+        if not polygons:
+            continue
+        polygons = [np.round(np.asarray(polygon, np.float32)).astype(np.int32) for polygon in polygons]
+        points = np.concatenate(polygons)
+        xmin, ymin = np.maximum(points.min(axis=0), 0)
+        xmax, ymax = np.minimum(points.max(axis=0) + 1, (width, height))
+        if xmax <= xmin or ymax <= ymin:
+            continue
+
+        inside = np.zeros((ymax - ymin, xmax - xmin), np.uint8)
+        cv2.fillPoly(inside, [polygon - (xmin, ymin) for polygon in polygons], 255)
+        region = page[ymin:ymax, xmin:xmax].astype(np.int16)
+        far = np.abs(region - background.astype(np.int16)).max(axis=2) > contrast
+        mask[ymin:ymax, xmin:xmax] |= np.where(far, inside, 0).astype(np.uint8)
+    return mask
@@ -0,0 +1,114 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from metrics import METRICS
+
+# format -> (file suffix, PIL format name)
+OUTPUT_FORMATS = {
+    "png": (".png", "PNG"),
+    "webp": (".webp", "WEBP"),
+    "jpeg": (".jpg", "JPEG"),
+}
+
+
+class OutputEncoder:
+    def __init__(self, format="png", compress_level=1, quality=90):
+        """
+        How rendered pages are encoded on disk.
+
+        Args:
+            format (str): "png", "webp" (lossless) or "jpeg".
+            compress_level (int): zlib level for PNG, 0-9. Pillow's default of 6 is several times
+                                  slower than 1 on full pages for a file only slightly smaller.
+            quality (int): JPEG quality.
+        """
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(f"format must be one of {tuple(OUTPUT_FORMATS)}, got {format!r}")
+        self.format = format
+        self.compress_level = compress_level
+        self.quality = quality
+
+    @property
+    def suffix(self):
+        return OUTPUT_FORMATS[self.format][0]
+
+    def output_name(self, page_name):
+        """File name of the rendered version of page `page_name`"""
+        return Path(page_name).with_suffix(self.suffix).name
+
+    def save(self, img, path):
+        """
+        Encode `img` to `path` through a temporary file, so a partially written page is never visible.
+        """
+        path = Path(path)
+        if self.format == "png":
+            options = {"compress_level": self.compress_level, "optimize": False}
+        elif self.format == "webp":
+            options = {"lossless": True, "method": 4}
+        else:
+            options = {"quality": self.quality}
+
+        # Keep the real suffix last so that tools looking at the name still see an image
+        tmp_path = path.with_name(f".{path.stem}.tmp{path.suffix}")
+        img.save(tmp_path, format=OUTPUT_FORMATS[self.format][1], **options)
+        os.replace(tmp_path, path)
+
+
+class PageWriter:
+    def __init__(self, encoder, workers=2, max_pending=4):
+        """
+        Background pool that encodes and writes rendered pages.
+
+        Args:
+            encoder (OutputEncoder): Encoding used for every page.
+            workers (int): Number of encoding threads (Pillow releases the GIL while encoding).
+            max_pending (int): Pages allowed to wait for encoding; `submit` blocks beyond that,
+                               which bounds the memory held by finished but unsaved pages.
+        """
+        self.encoder = encoder
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page-writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def submit(self, img, path, on_written=None):
+        """
+        Queue `img` to be written to `path`.
+
+        Args:
+            img (PIL.Image): Rendered page.
+            path (str or Path): Destination file.
+            on_written (callable, optional): Called without arguments on the writer thread once the
+                                             file is in place; the future completes after it.
+
+        Returns:
+            concurrent.futures.Future: Resolves to `path`, or raises the encoding error.
+        """
+        self._slots.acquire()
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._executor.submit(self._write, img, path, on_written)
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(lambda _: self._done())
+        return future
+
+    def _done(self):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def _write(self, img, path, on_written):
+        with METRICS.time("manga_stage_seconds", stage="encode"):
+            self.encoder.save(img, path)
+        print(f"  Saved -> {path}")
+        if on_written is not None:
+            on_written()
+        return path
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,351 @@
+import queue
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from metrics import METRICS
+from result_cache import make_key
+from page_image import load_page
+
+# Marks the end of the input for a stage
+_DONE = object()
+
+
+class PageInput:
+    def __init__(self, name, path=None, pixels=None, data=None):
+        """
+        A page entering the pipeline, either a file on disk or an image received in memory.
+
+        Args:
+            name (str): File name used for the output page.
+            path (str or Path, optional): Location of the page file.
+            pixels (numpy.ndarray, optional): Page already decoded by `load_page`.
+            data (bytes, optional): Encoded page bytes, used for the cache key of in-memory pages.
+        """
+        self.name = name
+        self.path = path
+        self.pixels = pixels
+        self.data = data
+        # Refined text mask from the detector; not available for cached or pool-extracted pages
+        self.text_mask = None
+        # Seconds spent on this page per stage, and whether its results came from the cache
+        self.timings = {}
+        self.cached = False
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(Path(path).name, path=path)
+
+    def decode(self):
+        """
+        Decode the page on first use. Detection, OCR cropping and rendering all share the result.
+        """
+        if self.pixels is None:
+            start = time.perf_counter()
+            self.pixels = load_page(self.data if self.data is not None else self.path)
+            self.timings["decode"] = time.perf_counter() - start
+            METRICS.observe("manga_stage_seconds", self.timings["decode"], stage="decode")
+        return self.pixels
+
+    def release(self):
+        # The decoded page is no longer needed once it has been rendered
+        self.pixels = None
+        self.text_mask = None
+
+    def read_bytes(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def __str__(self):
+        return self.name
+
+
+class PagePipeline:
+    def __init__(self, extractor, render_page, detect_workers=1, ocr_workers=1, render_workers=1,
+                 queue_size=2, ocr_max_pages=4, on_page_done=None, cache=None, on_event=None,
+                 cancel_event=None, pool=None):
+        """
+        Run detection, OCR and rendering of a chapter as overlapping stages.
+
+        Each stage has its own worker threads and the stages are connected by bounded
+        queues, so while page N is being recognized page N+1 can already be in the
+        detector and page N-1 in the renderer.
+
+        Args:
+            extractor (MangaTextExtractor): Loaded extractor providing `detect` and `recognize`.
+            render_page (callable): render_page(page, results) draws and saves one page (a PageInput);
+                                    `page.decode()` returns the array the detector already used and
+                                    `page.text_mask` its text mask, when detection ran in this process. It may
+                                    return a Future of a background write, in which case the page counts
+                                    as done once the future completes.
+            detect_workers (int): Number of detection threads.
+            ocr_workers (int): Number of OCR threads.
+            render_workers (int): Number of rendering / PNG encoding threads.
+            queue_size (int): Maximum number of pages waiting between two stages.
+            ocr_max_pages (int): Maximum number of already detected pages recognized in one OCR batch.
+            on_page_done (callable, optional): Called with the number of completed pages each time a page is saved.
+            cache (ResultCache, optional): Result cache; pages found in it skip detection and OCR.
+            on_event (callable, optional): Called as on_event(event, page) when a page is "detected",
+                                           "ocr_done" or "rendered".
+            cancel_event (threading.Event, optional): Once set, no new pages are taken and queued pages are dropped.
+            pool (ExtractorPool, optional): Worker processes to run detection and OCR in. When given, each
+                                            page is extracted by one worker and only rendering runs in this process.
+        """
+        self.extractor = extractor
+        self.render_page = render_page
+        self.workers = {"detect": detect_workers, "ocr": ocr_workers, "render": render_workers}
+        self.queue_size = queue_size
+        self.ocr_max_pages = ocr_max_pages
+        self.on_page_done = on_page_done
+        self.cache = cache
+        self.on_event = on_event
+        self.cancel_event = cancel_event
+        self.pool = pool
+        if pool is not None:
+            # One feeding thread per worker process keeps all of them busy
+            self.workers["extract"] = pool.workers
+
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._pending_writes = 0
+        self._writes_done = threading.Condition()
+
+    def run(self, image_files):
+        """
+        Process all pages and block until the last one has been rendered.
+
+        Pages are pulled from `image_files` lazily, so it may be a generator that is still
+        receiving pages while the first ones are already being processed.
+
+        Args:
+            image_files (iterable): Paths of the pages to process, or PageInput objects.
+
+        Returns:
+            int: Number of pages that were rendered successfully.
+        """
+        self._completed = 0
+
+        detect_q = queue.Queue(maxsize=self.queue_size)
+        ocr_q = queue.Queue(maxsize=self.queue_size)
+        render_q = queue.Queue(maxsize=self.queue_size)
+
+        METRICS.track_queues(self, {"detect": detect_q, "ocr": ocr_q, "render": render_q})
+
+        threads = []
+        if self.pool is not None:
+            threads += self._start_stage("extract", detect_q, render_q, self._extract_in_pool)
+        else:
+            threads += self._start_stage("detect", detect_q, ocr_q, self._detect)
+            threads += self._start_stage("ocr", ocr_q, render_q, self._ocr)
+        threads += self._start_stage("render", render_q, None, self._render)
+
+        # Feed the first stage; blocks whenever the detector falls behind
+        for page in image_files:
+            if self._cancelled():
+                break
+            if not isinstance(page, PageInput):
+                page = PageInput.from_path(page)
+            detect_q.put(page)
+        detect_q.put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        # Pages handed to a background writer are only done once they are on disk
+        with self._writes_done:
+            self._writes_done.wait_for(lambda: self._pending_writes == 0)
+
+        METRICS.untrack_queues(self)
+        return self._completed
+
+    def _start_stage(self, name, in_q, out_q, handle):
+        remaining = [self.workers[name]]
+
+        def worker():
+            try:
+                handle(in_q, out_q)
+            finally:
+                # The last worker of a stage tells the next stage that no more pages are coming
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and out_q is not None:
+                    out_q.put(_DONE)
+
+        threads = []
+        for i in range(self.workers[name]):
+            thread = threading.Thread(target=worker, name=f"pipeline-{name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def _items(self, in_q):
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                # Leave the marker in place for the other workers of this stage
+                in_q.put(_DONE)
+                return
+            if self._cancelled():
+                # Keep draining so the upstream stages can finish
+                continue
+            yield item
+
+    def _cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _cache_lookup(self, page):
+        """Return (cache key, cached results or None)"""
+        if self.cache is None:
+            return None, None
+        key = make_key(page.read_bytes(), self.extractor.model_identity, self.extractor.input_size)
+        results = self.cache.get(key)
+        page.cached = results is not None
+        METRICS.inc("manga_result_cache_total", result="hit" if page.cached else "miss")
+        return key, results
+
+    def _cache_put(self, page, key, results):
+        """Store the results of a page; a failed write is logged and never stops the stage"""
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(key, results)
+        except Exception as e:
+            print(f"  [WARN] {page}: could not cache results: {e}")
+
+    def _extract_in_pool(self, in_q, out_q):
+        for page in self._items(in_q):
+            try:
+                key, results = self._cache_lookup(page)
+                if results is None:
+                    start = time.perf_counter()
+                    results = self.pool.extract(page)
+                    page.timings["extract"] = time.perf_counter() - start
+                    METRICS.observe("manga_stage_seconds", page.timings["extract"], stage="extract")
+                    METRICS.observe("manga_page_bubbles", len(results))
+                    self._cache_put(page, key, results)
+            except Exception as e:
+                _report_error(page, e)
+                continue
+            self._emit("detected", page)
+            self._emit("ocr_done", page)
+            out_q.put((page, results))
+
+    def _detect(self, in_q, out_q):
+        for page in self._items(in_q):
+            try:
+                key, cached = self._cache_lookup(page)
+                if cached is not None:
+                    # Already extracted before; skip both models
+                    self._emit("detected", page)
+                    out_q.put((page, key, None, cached))
+                    continue
+
+                pixels = page.decode()
+                start = time.perf_counter()
+                pixels, boxes, page.text_mask = self.extractor.detect(pixels, with_mask=True)
+                detection = (pixels, boxes)
+                page.timings["detect"] = time.perf_counter() - start
+                METRICS.observe("manga_page_bubbles", len(detection[1]))
+            except Exception as e:
+                _report_error(page, e)
+                continue
+            self._emit("detected", page)
+            out_q.put((page, key, detection, None))
+
+    def _ocr(self, in_q, out_q):
+        for first in self._items(in_q):
+            batch = [first]
+
+            # Recognize pages that are already waiting together to keep OCR batches full
+            while len(batch) < self.ocr_max_pages:
+                try:
+                    item = in_q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    in_q.put(_DONE)
+                    break
+                batch.append(item)
+
+            # Pages served from the cache pass straight through
+            pending = [detection for _, _, detection, cached in batch if cached is None]
+            failed = False
+            try:
+                start = time.perf_counter()
+                recognized = iter(self.extractor.recognize(pending))
+                # The batch is shared, so each page is charged its share of it
+                ocr_time = (time.perf_counter() - start) / max(1, len(pending))
+            except Exception as e:
+                for page, _, _, cached in batch:
+                    if cached is None:
+                        _report_error(page, e)
+                failed = True
+
+            for page, key, _, results in batch:
+                if results is None:
+                    if failed:
+                        continue
+                    results = next(recognized)
+                    page.timings["ocr"] = ocr_time
+                    self._cache_put(page, key, results)
+                self._emit("ocr_done", page)
+                out_q.put((page, results))
+
+    def _render(self, in_q, out_q):
+        for page, results in self._items(in_q):
+            try:
+                start = time.perf_counter()
+                written = self.render_page(page, results)
+                page.timings["render"] = time.perf_counter() - start
+            except Exception as e:
+                _report_error(page, e)
+                continue
+            finally:
+                page.release()
+
+            if written is None:
+                self._page_done(page)
+                continue
+
+            with self._writes_done:
+                self._pending_writes += 1
+            submitted = time.perf_counter()
+            written.add_done_callback(lambda future, page=page: self._page_written(page, future, submitted))
+
+    def _page_written(self, page, future, submitted):
+        page.timings["write"] = time.perf_counter() - submitted
+        try:
+            error = future.exception()
+            if error is not None:
+                METRICS.inc("manga_pages_total", status="failed")
+                print(f"  [ERROR] {page}: {error}")
+                traceback.print_exception(type(error), error, error.__traceback__)
+            else:
+                self._page_done(page)
+        finally:
+            with self._writes_done:
+                self._pending_writes -= 1
+                self._writes_done.notify_all()
+
+    def _page_done(self, page):
+        METRICS.inc("manga_pages_total", status="rendered")
+        with self._lock:
+            self._completed += 1
+            completed = self._completed
+            if self.on_page_done is not None:
+                self.on_page_done(completed)
+            self._emit("rendered", page)
+
+    def _emit(self, event, page):
+        if self.on_event is not None:
+            self.on_event(event, page)
+
+
+def _report_error(page, error):
+    METRICS.inc("manga_pages_total", status="failed")
+    print(f"  [ERROR] {page}: {error}")
+    traceback.print_exc()
@@ -0,0 +1,278 @@
+import os
+import textwrap
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from fonts import FONTS, GLYPH_METRICS
+from inpainting import Inpainter
+from metrics import METRICS
+from page_image import bubble_backgrounds, text_mask_from_lines
+from page_writer import OutputEncoder
+
+# Drawing the translated text over a page. Kept apart from server.py so that it can be used
+# (by benchmark.py, for instance) without starting the server's caches, index and job threads.
+
+# Bump when render_page output changes, so chapters rendered before are redone
+RENDER_VERSION = 3
+
+# Font sizes tried by fit_text are multiples of this (half-point precision)
+FONT_SIZE_STEP = 0.5
+
+# Encoding of the rendered pages: "png", "webp" or "jpeg"
+OUTPUT_ENCODER = OutputEncoder(
+    os.environ.get("MANGA_OUTPUT_FORMAT", "png"),
+    compress_level=int(os.environ.get("MANGA_PNG_COMPRESS_LEVEL", "1")),
+    quality=int(os.environ.get("MANGA_JPEG_QUALITY", "90")),
+)
+
+# Seconds a page may spend inpainting its original lettering; "0" fills the text lines instead
+INPAINT_BUDGET = float(os.environ.get("MANGA_INPAINT_BUDGET", "0.5"))
+INPAINTER = Inpainter(workers=4, budget=INPAINT_BUDGET, method=os.environ.get("MANGA_INPAINT_METHOD", "telea")) if INPAINT_BUDGET > 0 else None
+
+
+def get_vertical_lines(draw, text, font, box_height):
+    lines = []
+    current_line = ""
+    current_h = 0
+    char_spacing = int(font.size * 0.2)
+
+    GLYPH_METRICS.warm(font, text)
+
+    for char in text:
+        char_h = GLYPH_METRICS.height(font, char)
+
+        if current_h + char_h + char_spacing > box_height and current_line:
+            lines.append(current_line)
+            current_line = char
+            current_h = char_h + char_spacing
+        else:
+            current_line += char
+            current_h += char_h + char_spacing
+
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def layout_if_fits(draw, text, box_width, box_height, font, is_vertical):
+    """Lay out text with one font; returns the layout data, or None if it overflows the box"""
+    font_size = font.size
+
+    if is_vertical:
+        lines = get_vertical_lines(draw, text, font, box_height)
+        char_width = GLYPH_METRICS.width(font, "あ")
+        line_spacing = int(font_size * 0.2)
+        total_width = len(lines) * char_width + max(0, len(lines) - 1) * line_spacing
+
+        if total_width <= box_width:
+            return lines
+    else:
+        target_width = box_width * 0.95
+        avg_char_width = font_size
+        if avg_char_width <= 0:
+            return None
+
+        chars_per_line = max(1, int(target_width / avg_char_width))
+        wrapped_text = textwrap.fill(text, width=chars_per_line)
+
+        bbox = draw.multiline_textbbox((0, 0), wrapped_text, font=font, spacing=4)
+        w = bbox[2] - bbox[0]
+        h = bbox[3] - bbox[1]
+
+        if w <= box_width and h <= box_height:
+            return wrapped_text
+
+    return None
+
+
+def fit_text(draw, text, box_width, box_height, font_path, is_vertical=False, estimated_font_size=None, charset=None):
+    min_font_size = 10
+    max_font_size = 100
+
+    if estimated_font_size and estimated_font_size > min_font_size:
+        start_font_size = min(int(estimated_font_size * 1.5), max_font_size)
+    else:
+        start_font_size = max_font_size
+
+    best_font = None
+    best_data = None
+
+    # Whether the text fits only gets worse as the font grows, so bisect for the
+    # largest fitting size on a FONT_SIZE_STEP grid between min and start size
+    low = 0
+    high = int((start_font_size - min_font_size) / FONT_SIZE_STEP)
+
+    while low <= high:
+        mid = (low + high) // 2
+        font_size = min_font_size + mid * FONT_SIZE_STEP
+
+        try:
+            font = FONTS.get(font_size, font_path)
+        except IOError:
+            break
+
+        if is_vertical:
+            # Measure the whole page's characters at this size in one go; horizontal layout
+            # measures whole lines with Pillow instead
+            GLYPH_METRICS.warm(font, charset or text)
+
+        data = layout_if_fits(draw, text, box_width, box_height, font, is_vertical)
+        if data is not None:
+            best_font = font
+            best_data = data
+            low = mid + 1
+        else:
+            high = mid - 1
+
+    if best_font is None:
+        try:
+            best_font = FONTS.get(min_font_size, font_path)
+        except:
+            best_font = ImageFont.load_default()
+        if is_vertical:
+            best_data = get_vertical_lines(draw, text, best_font, box_height)
+        else:
+            best_data = textwrap.fill(text, width=max(1, int(box_width * 0.9 / min_font_size)))
+
+    return best_data, best_font
+
+
+def draw_vertical_text_rtl(draw, lines, font, box_x, box_y, box_width, box_height, text_color="white", line_spacing=4):
+    char_width = GLYPH_METRICS.width(font, "あ")
+    char_spacing = int(font.size * 0.1)
+
+    total_width = len(lines) * char_width + max(0, len(lines) - 1) * line_spacing
+    start_x = box_x + box_width / 2 + total_width / 2 - char_width
+
+    for i, line in enumerate(lines):
+        current_x = start_x - i * (char_width + line_spacing)
+        line_height = sum([GLYPH_METRICS.height(font, c) + char_spacing for c in line])
+        line_height -= char_spacing
+        current_y = box_y + box_height / 2 - line_height / 2
+
+        for char in line:
+            draw.text((current_x, current_y), char, font=font, fill=text_color)
+            current_y += GLYPH_METRICS.height(font, char) + char_spacing
+
+
+def render_page(image_path, results, font_path, output_dir, filename=None, writer=None, on_written=None,
+                text_mask=None):
+    """
+    Draw the translated text over a page and save it with OUTPUT_ENCODER.
+
+    The original lettering is inpainted when INPAINTER is enabled, using `text_mask` (the
+    detector's mask, page sized) or else a mask derived from the line polygons. Bubbles that
+    are not inpainted within the page's budget get their line polygons filled instead.
+
+    With a `writer` (PageWriter), encoding happens in the background and the Future of the
+    write is returned; `on_written` runs once the file is in place. Otherwise the page is
+    saved before returning.
+    """
+    # Pages decoded by the pipeline arrive as BGR arrays; drawing happens on an RGB copy
+    if isinstance(image_path, np.ndarray):
+        pixels = cv2.cvtColor(image_path, cv2.COLOR_BGR2RGB)
+    else:
+        with Image.open(image_path) as source:
+            pixels = np.array(source.convert("RGB"))
+    positions = [item['position'] for item in results]
+
+    # Background colour of every bubble, measured on the page before anything is drawn over it
+    with METRICS.time("manga_stage_seconds", stage="background"):
+        backgrounds, _ = bubble_backgrounds(pixels, positions)
+
+    inpainted = set()
+    if INPAINTER is not None and results:
+        with METRICS.time("manga_stage_seconds", stage="inpaint"):
+            if text_mask is None:
+                text_mask = text_mask_from_lines(pixels, [item.get('lines') or [] for item in results], backgrounds)
+            inpainted = INPAINTER.inpaint(pixels, positions, text_mask)
+
+    img = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(img)
+
+    alignment_map = {0: "left", 1: "center", 2: "right"}
+
+    # Time spent drawing text, without the font fitting
+    draw_time = 0.0
+
+    # Every character drawn on this page, measured together per font size
+    page_charset = "あ" + "".join(item['text'] for item in results)
+
+    for i, (item, background) in enumerate(zip(results, backgrounds)):
+        print(f"  ID: {item['id']} | Text: {item['text'][:30]}...")
+
+        xmin, ymin, xmax, ymax = item['position']
+        text = item['text']
+        width = xmax - xmin
+        height = ymax - ymin
+
+        is_vertical = item.get('vertical', height > width * 1.5)
+        line_spacing_ratio = item.get('line_spacing', 1.0)
+        alignment = alignment_map.get(item.get('alignment', 1), "center")
+
+        fill_color = tuple(int(c) for c in background)
+        # Dark text on light bubbles, light text on dark ones (Rec. 601 luma)
+        luma = 0.299 * fill_color[0] + 0.587 * fill_color[1] + 0.114 * fill_color[2]
+        text_color = "black" if luma > 128 else "white"
+
+        lines = item.get('lines') or []
+        if i in inpainted:
+            # The original lettering is already gone
+            pass
+        elif lines:
+            # Cover only the original lettering so the art around it stays visible; the outline
+            # widens each line a little to catch anti-aliased stroke edges
+            pad = max(2, round(item.get('font_size', 0) * 0.15))
+            for polygon in lines:
+                draw.polygon([tuple(point) for point in polygon], fill=fill_color, outline=fill_color, width=pad)
+        else:
+            draw.rectangle([xmin, ymin, xmax, ymax], fill=fill_color)
+
+        estimated_size = item.get('font_size', -1)
+        with METRICS.time("manga_stage_seconds", stage="fit_text"):
+            best_data, custom_font = fit_text(
+                draw, text, width, height, font_path, is_vertical, estimated_font_size=estimated_size,
+                charset=page_charset
+            )
+        draw_start = time.perf_counter()
+
+        current_font_size = custom_font.size
+        pixel_spacing = int(current_font_size * line_spacing_ratio * 0.2)
+
+        if is_vertical:
+            draw_vertical_text_rtl(
+                draw, best_data, custom_font, xmin, ymin, width, height,
+                text_color=text_color, line_spacing=pixel_spacing
+            )
+        else:
+            bbox = draw.multiline_textbbox((0, 0), best_data, font=custom_font, spacing=pixel_spacing)
+            text_w = bbox[2] - bbox[0]
+            text_h = bbox[3] - bbox[1]
+            draw_x = xmin + width / 2 - text_w / 2
+            draw_y = ymin + height / 2 - text_h / 2
+
+            draw.multiline_text(
+                (draw_x, draw_y),
+                best_data,
+                fill=text_color,
+                font=custom_font,
+                align=alignment,
+                spacing=pixel_spacing
+            )
+        draw_time += time.perf_counter() - draw_start
+
+    METRICS.observe("manga_stage_seconds", draw_time, stage="draw")
+
+    filename = OUTPUT_ENCODER.output_name(filename or Path(image_path).name)
+    output_path = output_dir / filename
+    if writer is not None:
+        return writer.submit(img, output_path, on_written)
+
+    OUTPUT_ENCODER.save(img, output_path)
+    print(f"  Saved -> {output_path}")
+    if on_written is not None:
+        on_written()
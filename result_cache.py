@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import sidecar
+
+
+def make_key(image_bytes, model_identity, input_size):
+    """
+    Build the cache key for a page.
+
+    Args:
+        image_bytes (bytes): Raw bytes of the page file.
+        model_identity (str): Identifies the detector and OCR weights that produced the result.
+        input_size: Detector input size the result was computed with.
+
+    Returns:
+        str: Hex digest used as the cache file name.
+    """
+    h = hashlib.sha256()
+    h.update(f"{model_identity}|{input_size}|".encode("utf-8"))
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        """
+        On-disk cache of extract() results, keyed by page content.
+
+        Entries are result sidecars (see sidecar.py). Reading an entry refreshes its modification time,
+        and once the directory grows past `max_bytes` the least recently used entries
+        are deleted, down to 90% of it. The size of the directory is kept as a running total,
+        so the directory is only listed when the cap is crossed.
+
+        Args:
+            cache_dir (str or Path): Directory holding the cache entries.
+            max_bytes (int): Size cap for the whole cache directory.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes of all entries; None until the directory is first listed
+        self._size = None
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}{sidecar.SIDECAR_SUFFIX}"
+
+    def get(self, key):
+        """
+        Return the cached result list for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        with self._lock:
+            try:
+                results = sidecar.read(path)
+            except (OSError, ValueError):
+                return None
+            # Mark as recently used
+            os.utime(path)
+        return results
+
+    def put(self, key, results):
+        """
+        Store the result list for `key` and evict old entries if the cache is too large.
+        """
+        path = self._path(key)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            self._size -= self._file_size(path)
+            sidecar.write(path, results)
+            self._size += self._file_size(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def invalidate(self, key=None):
+        """
+        Remove one entry, or every entry when `key` is None.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock:
+            paths = [self._path(key)] if key is not None else list(self.cache_dir.glob(f"*{sidecar.SIDECAR_SUFFIX}"))
+            removed = 0
+            for path in paths:
+                size = self._file_size(path)
+                try:
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+                if self._size is not None:
+                    self._size -= size
+            return removed
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob(f"*{sidecar.SIDECAR_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        # Evicting below the cap leaves room for many puts before the directory is listed again
+        target = self.max_bytes * 0.9
+
+        # Oldest first
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._size = total
@@ -1,332 +1,690 @@
 import sys
 import os
+import re
 import glob
 import threading
+import time
+import hashlib
+import shutil
+from functools import lru_cache
 from pathlib import Path
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from PIL import Image
 import webbrowser
 
 # Add comic-text-detector folder to path to allow import
 sys.path.append(str(Path(__file__).parent / "comic-text-detector"))
-from text_extracter import MangaTextExtractor
+from page_image import load_page
+from renderer import FONT_SIZE_STEP, INPAINTER, OUTPUT_ENCODER, RENDER_VERSION, render_page
+from pipeline import PageInput, PagePipeline
+from jobs import Job, JobConflict, JobManager, JobQueueFull
+from result_cache import ResultCache
+from fonts import FONTS
+from events import EventBroker
+from text_index import TextIndex
+from manifest import ChapterManifest, digest
+from image_variants import FORMATS, VariantStore, pick_format, pick_width
+from page_writer import PageWriter
+from metrics import METRICS, TraceLog
 
 app = Flask(__name__)
 CORS(app)
 
-# ----------------------------------------
-# Helper Functions
-# ----------------------------------------
+# Extractor worker processes are spawned, and spawning re-runs this script in every worker under
+# the name "__mp_main__". The workers only need the pickled extractor, so the caches, index,
+# job threads and writer pool below are only created in the server process itself.
+SERVER_PROCESS = __name__ != "__mp_main__"
 
-def get_vertical_lines(draw, text, font, box_height):
-    lines = []
-    current_line = ""
-    current_h = 0
-    char_spacing = int(font.size * 0.2)
+# Worker threads per pipeline stage and pages allowed to wait between stages
+PIPELINE_SETTINGS = {
+    "detect_workers": 1,
+    "ocr_workers": 1,
+    "render_workers": 2,
+    "queue_size": 2,
+}
 
-    for char in text:
-        bbox = draw.textbbox((0, 0), char, font=font)
-        char_h = bbox[3] - bbox[1]
+# "thread" runs the models in the server process; "process" runs them in PROCESS_WORKERS
+# worker processes that share one copy of the weights (defaults to half the CPU cores)
+EXECUTION_MODE = os.environ.get("MANGA_EXECUTION_MODE", "thread")
+PROCESS_WORKERS = int(os.environ.get("MANGA_PROCESS_WORKERS", "0")) or None
 
-        if current_h + char_h + char_spacing > box_height and current_line:
-            lines.append(current_line)
-            current_line = char
-            current_h = char_h + char_spacing
-        else:
-            current_line += char
-            current_h += char_h + char_spacing
+# Inference backend of the extractor: "eager", "int8" or "onnx" (see text_extracter.INFERENCE_BACKENDS)
+INFERENCE_BACKEND = os.environ.get("MANGA_BACKEND", "eager")
 
-    if current_line:
-        lines.append(current_line)
-    return lines
+# Load and warm up the models on a background thread as soon as the server starts; "0" loads
+# them with the first job instead. Readiness is reported by /health.
+PRELOAD_MODELS = os.environ.get("MANGA_PRELOAD_MODELS", "1") != "0"
 
+# Pick the detector input size per page (640-1024) instead of always detecting at 1024; "1" turns it on.
+# Off by default until benchmark.py shows it is faster on real chapters.
+ADAPTIVE_DETECTOR_INPUT = os.environ.get("MANGA_ADAPTIVE_INPUT", "0") == "1"
 
-def fit_text(draw, text, box_width, box_height, font_path, is_vertical=False, estimated_font_size=None):
-    min_font_size = 10
-    max_font_size = 100
+# Extraction results of previously seen pages, keyed by page content
+RESULT_CACHE = ResultCache(Path(__file__).parent / "cache" / "results", max_bytes=256 * 1024 * 1024) if SERVER_PROCESS else None
 
-    if estimated_font_size and estimated_font_size > min_font_size:
-        start_font_size = min(int(estimated_font_size * 1.5), max_font_size)
-    else:
-        start_font_size = max_font_size
+# Background pool writing the rendered pages with OUTPUT_ENCODER (see renderer.py)
+PAGE_WRITER = PageWriter(OUTPUT_ENCODER, workers=2, max_pending=4) if SERVER_PROCESS else None
 
-    best_font = None
-    best_data = None
+# Per-page trace records (JSON Lines) are appended here when MANGA_TRACE_FILE is set
+TRACE_LOG = TraceLog(os.environ["MANGA_TRACE_FILE"]) if os.environ.get("MANGA_TRACE_FILE") and SERVER_PROCESS else None
 
-    for font_size in range(start_font_size, min_font_size - 1, -2):
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-        except IOError:
-            font = ImageFont.load_default()
-            best_font = font
-            break
-
-        if is_vertical:
-            lines = get_vertical_lines(draw, text, font, box_height)
-            bbox_a = draw.textbbox((0, 0), "あ", font=font)
-            char_width = bbox_a[2] - bbox_a[0]
-            line_spacing = int(font_size * 0.2)
-            total_width = len(lines) * char_width + max(0, len(lines) - 1) * line_spacing
-
-            if total_width <= box_width:
-                best_font = font
-                best_data = lines
-                break
-        else:
-            target_width = box_width * 0.95
-            avg_char_width = font_size
-            if avg_char_width <= 0:
+# Re-encoded (WebP/AVIF) and downscaled versions of rendered pages served by /pages/<filename>
+PAGE_VARIANTS = VariantStore(Path(__file__).parent / "cache" / "variants") if SERVER_PROCESS else None
+
+# Per-page progress pushed to /events subscribers
+EVENTS = EventBroker()
+
+# ----------------------------------------
+# Helper Functions
+# ----------------------------------------
+
+def get_extractor():
+    """Load the models once; all jobs share the same extractor"""
+    global global_extractor
+
+    with extractor_lock:
+        # Reuse global extractor to avoid reloading models
+        if global_extractor is None:
+            # Imported here: torch, transformers and the detector take seconds to import, and the
+            # server should answer requests while they load
+            from text_extracter import MangaTextExtractor
+
+            print("Loading models...")
+            MODEL_STATE.update(status="loading", error=None)
+            start = time.perf_counter()
+            try:
+                global_extractor = MangaTextExtractor(
+                    backend=INFERENCE_BACKEND, adaptive_input=ADAPTIVE_DETECTOR_INPUT
+                )
+            except Exception as e:
+                MODEL_STATE.update(status="failed", error=str(e))
+                raise
+            MODEL_STATE.update(status="loaded", load_seconds=round(time.perf_counter() - start, 2))
+        return global_extractor
+
+
+def get_pool():
+    """Start the extractor worker processes once when running in process mode"""
+    global global_pool
+
+    if EXECUTION_MODE != "process":
+        return None
+
+    extractor = get_extractor()
+    with extractor_lock:
+        if global_pool is None:
+            from worker_pool import ExtractorPool
+
+            global_pool = ExtractorPool(extractor, workers=PROCESS_WORKERS)
+        return global_pool
+
+
+def warm_fonts():
+    """Load the common font sizes before the first job needs them; started on a background thread"""
+    MODEL_STATE["fonts"] = "warming"
+    start = time.perf_counter()
+    try:
+        FONTS.warm()
+    except Exception as e:
+        print(f"Failed to load fonts: {e}")
+        MODEL_STATE["fonts"] = "failed"
+        return
+    MODEL_STATE.update(fonts="ready", fonts_seconds=round(time.perf_counter() - start, 2))
+
+
+def preload_models():
+    """Load the models and run one warm-up inference; started on a background thread at startup"""
+    try:
+        extractor = get_extractor()
+        get_pool()
+        MODEL_STATE["status"] = "warming"
+        start = time.perf_counter()
+        extractor.warm_up()
+        MODEL_STATE.update(status="ready", warmup_seconds=round(time.perf_counter() - start, 2))
+        print(f"Models ready (loaded in {MODEL_STATE['load_seconds']}s, warm-up {MODEL_STATE['warmup_seconds']}s)")
+    except Exception as e:
+        print(f"Failed to load models: {e}")
+        MODEL_STATE.update(status="failed", error=str(e))
+
+
+def run_job(job):
+    """Run the processing pipeline over the pages of `job`"""
+    output_dir = job.output_dir
+    # Pages from earlier runs stay; the chapter manifest decides which are still valid
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if job.chapter is None:
+        # Lets a later start of the server tell this directory from a chapter's and remove it
+        (output_dir / JOB_OUTPUT_MARKER).write_text(job.id)
+    manifest = ChapterManifest(output_dir)
+    EVENTS.publish("started", job.id, total=job.total)
+
+    # First loadable font of the fallback chain (resolved once per process)
+    font_path = FONTS.resolve()
+    extractor = get_extractor()
+    pool = get_pool()
+
+    # Everything that changes how a page comes out; a page rendered with other settings is redone
+    settings_hash = digest({
+        "model": extractor.model_identity,
+        "input_size": extractor.input_size,
+        "font": font_path,
+        "font_size_step": FONT_SIZE_STEP,
+        "renderer": RENDER_VERSION,
+        "output_format": OUTPUT_ENCODER.format,
+        "inpaint": INPAINTER.method if INPAINTER is not None else None,
+    })
+
+    input_hashes = {}
+    counts = {"skipped": 0, "rendered": 0}
+    progress_lock = threading.Lock()
+
+    def update_progress(skipped=0, rendered=0):
+        with progress_lock:
+            counts["skipped"] += skipped
+            counts["rendered"] += rendered
+            job.progress = counts["skipped"] + counts["rendered"]
+
+    def pages_to_process():
+        """Pages of the job whose output is missing or outdated; the others are served from the manifest"""
+        for page in job.iter_pages():
+            if not isinstance(page, PageInput):
+                page = PageInput.from_path(page)
+            input_hash = digest(page.read_bytes())
+            input_hashes[page.name] = input_hash
+
+            if manifest.is_current(page.name, input_hash, settings_hash):
+                job.results[page.name] = manifest.results(page.name)
+                update_progress(skipped=1)
+                METRICS.inc("manga_pages_total", status="skipped")
+                print(f"[{job.id}] [{job.progress}/{job.total}] {page.name} unchanged, skipped")
+                output_name = OUTPUT_ENCODER.output_name(page.name)
+                EVENTS.publish(
+                    "rendered", job.id, page=output_name, progress=job.progress, total=job.total,
+                    url=f"/pages/{output_name}?job={job.id}", skipped=True
+                )
                 continue
+            yield page
 
-            chars_per_line = max(1, int(target_width / avg_char_width))
-            wrapped_text = textwrap.fill(text, width=chars_per_line)
+    def render(page, results):
+        output_name = OUTPUT_ENCODER.output_name(page.name)
 
-            bbox = draw.multiline_textbbox((0, 0), wrapped_text, font=font, spacing=4)
-            w = bbox[2] - bbox[0]
-            h = bbox[3] - bbox[1]
+        def written():
+            manifest.record(page.name, input_hashes[page.name], settings_hash, output_name, results)
+            job.results[page.name] = results
+            TEXT_INDEX.add_page(output_dir.name, output_name, results)
 
-            if w <= box_width and h <= box_height:
-                best_font = font
-                best_data = wrapped_text
-                break
+        return render_page(
+            page.decode(), results, font_path, output_dir, page.name, writer=PAGE_WRITER, on_written=written,
+            text_mask=page.text_mask
+        )
 
-    if best_font is None:
-        try:
-            best_font = ImageFont.truetype(font_path, min_font_size)
-        except:
-            best_font = ImageFont.load_default()
-        if is_vertical:
-            best_data = get_vertical_lines(draw, text, best_font, box_height)
-        else:
-            best_data = textwrap.fill(text, width=max(1, int(box_width * 0.9 / min_font_size)))
+    def on_page_done(completed):
+        update_progress(rendered=1)
+        print(f"[{job.id}] [{job.progress}/{job.total}] Done")
+
+    def on_event(event, page):
+        output_name = OUTPUT_ENCODER.output_name(page.name)
+        data = {"page": output_name, "progress": job.progress, "total": job.total}
+        if event == "rendered":
+            data["url"] = f"/pages/{output_name}?job={job.id}"
+            if TRACE_LOG is not None:
+                TRACE_LOG.write({
+                    "time": time.time(),
+                    "job_id": job.id,
+                    "chapter": output_dir.name,
+                    "page": page.name,
+                    "bubbles": len(job.results.get(page.name, [])),
+                    "cached": page.cached,
+                    "seconds": {stage: round(t, 4) for stage, t in page.timings.items()},
+                })
+        EVENTS.publish(event, job.id, **data)
+
+    pipeline = PagePipeline(
+        extractor,
+        render,
+        on_page_done=on_page_done,
+        on_event=on_event,
+        cache=RESULT_CACHE,
+        cancel_event=job.cancel_event,
+        pool=pool,
+        **PIPELINE_SETTINGS
+    )
+    completed = pipeline.run(pages_to_process())
+
+    if job.complete and not job.cancelled:
+        # Pages that are no longer part of the chapter; partial runs leave the others alone
+        for name in manifest.prune(input_hashes):
+            TEXT_INDEX.remove_page(output_dir.name, OUTPUT_ENCODER.output_name(name))
+
+    print(f"\n✓ Job {job.id} complete! {completed}/{job.total} page(s) processed, {counts['skipped']} unchanged")
+    print(f"  View at: http://localhost:5001/viewer?job={job.id}\n")
+
+
+def find_downloaded_pages(num_pages=0):
+    # Try Downloads first, fall back to project downloads folder
+    downloads_dir = Path.home() / "Downloads"
 
-    return best_data, best_font
+    if not downloads_dir.exists() or not os.access(downloads_dir, os.R_OK):
+        downloads_dir = Path(__file__).parent / "downloads"
 
+    pattern = str(downloads_dir / "manga_page_*.png")
+    image_files = sorted(glob.glob(pattern))
 
-def draw_vertical_text_rtl(draw, lines, font, box_x, box_y, box_width, box_height, text_color="white", line_spacing=4):
-    bbox_a = draw.textbbox((0, 0), "あ", font=font)
-    char_width = bbox_a[2] - bbox_a[0]
-    char_spacing = int(font.size * 0.1)
+    if num_pages > 0:
+        image_files = image_files[:num_pages]
 
-    total_width = len(lines) * char_width + max(0, len(lines) - 1) * line_spacing
-    start_x = box_x + box_width / 2 + total_width / 2 - char_width
+    return downloads_dir, image_files
 
-    for i, line in enumerate(lines):
-        current_x = start_x - i * (char_width + line_spacing)
-        line_height = sum([
-            draw.textbbox((0, 0), c, font=font)[3] - draw.textbbox((0, 0), c, font=font)[1] + char_spacing
-            for c in line
-        ])
-        line_height -= char_spacing
-        current_y = box_y + box_height / 2 - line_height / 2
 
-        for char in line:
-            draw.text((current_x, current_y), char, font=font, fill=text_color)
-            bbox = draw.textbbox((0, 0), char, font=font)
-            current_y += (bbox[3] - bbox[1]) + char_spacing
+def submit_job(job):
+    """Admit a job, or build the error response when it cannot be accepted"""
+    try:
+        JOBS.submit(job)
+    except JobQueueFull as e:
+        return None, (jsonify({"status": "busy", "error": str(e)}), 429)
+    except JobConflict as e:
+        return None, (jsonify({"status": "error", "error": str(e)}), 409)
+    return job, None
 
 
-def process_image(image_path, extractor, font_path, output_dir):
-    print(f"\n{'='*40}")
-    print(f"Processing: {image_path}")
+def find_job(job_id=None):
+    """Job named in the request (or the latest job), or a 404 response"""
+    job = JOBS.get(job_id or request.args.get("job"))
+    if job is None:
+        return None, (jsonify({"status": "error", "error": "Job not found"}), 404)
+    return job, None
 
-    results = extractor.extract(image_path)
 
-    img = Image.open(image_path).convert("RGB")
-    draw = ImageDraw.Draw(img)
+def find_output():
+    """
+    Output directory named in the request, or a 404 response.
 
-    alignment_map = {0: "left", 1: "center", 2: "right"}
+    ?chapter= names a directory of PROCESSED_DIR, found on disk so that it stays reachable after a
+    restart; otherwise the directory of the job named by ?job= (or of the latest job) is used.
 
-    for item in results:
-        print(f"  ID: {item['id']} | Text: {item['text'][:30]}...")
+    Returns:
+        tuple: (output_dir, job, error). `job` is the latest job writing to the directory, or None.
+    """
+    chapter = request.args.get("chapter")
+    if chapter is None:
+        job, error = find_job()
+        return (job.output_dir if job else None), job, error
 
-        xmin, ymin, xmax, ymax = item['position']
-        text = item['text']
-        width = xmax - xmin
-        height = ymax - ymin
+    try:
+        parse_chapter({"chapter": chapter})
+    except ValueError as e:
+        return None, None, (jsonify({"status": "error", "error": str(e)}), 400)
+    output_dir = PROCESSED_DIR / chapter
+    if not output_dir.is_dir():
+        return None, None, (jsonify({"status": "error", "error": f"Chapter not found: {chapter}"}), 404)
+    job = next((job for job in reversed(JOBS.list_jobs()) if job.output_dir == output_dir), None)
+    return output_dir, job, None
 
-        is_vertical = item.get('vertical', height > width * 1.5)
-        bg_color = item.get('bg_color', (0, 0, 0))
-        line_spacing_ratio = item.get('line_spacing', 1.0)
-        alignment = alignment_map.get(item.get('alignment', 1), "center")
 
-        if not isinstance(bg_color, tuple):
-            bg_color = tuple(map(int, bg_color)) if hasattr(bg_color, '__iter__') else (0, 0, 0)
+def parse_chapter(data):
+    chapter = data.get("chapter")
+    if chapter is not None and not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", str(chapter)):
+        raise ValueError(f"Invalid chapter name: {chapter}")
+    return chapter
 
-        fill_color = "white" if sum(bg_color) > 600 else "black"
-        text_color = "black" if fill_color == "white" else "white"
 
-        draw.rectangle([xmin, ymin, xmax, ymax], fill=fill_color)
+# ----------------------------------------
+# Flask Endpoints
+# ----------------------------------------
 
-        estimated_size = item.get('font_size', -1)
-        best_data, custom_font = fit_text(
-            draw, text, width, height, font_path, is_vertical, estimated_font_size=estimated_size
-        )
+@app.route('/', methods=['GET'])
+def health():
+    return "Manga Server is Running!"
 
-        current_font_size = custom_font.size
-        pixel_spacing = int(current_font_size * line_spacing_ratio * 0.2)
-
-        if is_vertical:
-            draw_vertical_text_rtl(
-                draw, best_data, custom_font, xmin, ymin, width, height,
-                text_color=text_color, line_spacing=pixel_spacing
-            )
-        else:
-            bbox = draw.multiline_textbbox((0, 0), best_data, font=custom_font, spacing=pixel_spacing)
-            text_w = bbox[2] - bbox[0]
-            text_h = bbox[3] - bbox[1]
-            draw_x = xmin + width / 2 - text_w / 2
-            draw_y = ymin + height / 2 - text_h / 2
-
-            draw.multiline_text(
-                (draw_x, draw_y),
-                best_data,
-                fill=text_color,
-                font=custom_font,
-                align=alignment,
-                spacing=pixel_spacing
-            )
-
-    filename = Path(image_path).name
-    output_path = output_dir / filename
-    img.save(output_path)
-    print(f"  Saved -> {output_path}")
-
-
-def main(num_pages=0):
-    global global_extractor, processing_status
 
-    # Try Downloads first, fall back to project downloads folder
-    downloads_dir = Path.home() / "Downloads"
+# Global extractor to reuse across requests (avoids reloading models)
+global_extractor = None
+global_pool = None
+extractor_lock = threading.Lock()
 
-    if not downloads_dir.exists() or not os.access(downloads_dir, os.R_OK):
-        downloads_dir = Path(__file__).parent / "downloads"
+# Model readiness reported by /health: "idle" until loading starts, then "loading", "loaded"
+# (usable, not warmed up yet), "warming", "ready" or "failed". "fonts" follows the font
+# warm-up the same way ("idle", "warming", "ready" or "failed"); jobs don't wait for it.
+MODEL_STATE = {"status": "idle", "error": None, "load_seconds": None, "warmup_seconds": None,
+               "fonts": "idle", "fonts_seconds": None}
 
-    output_dir = Path(__file__).parent / "processed"
-    output_dir.mkdir(exist_ok=True)
+PROCESSED_DIR = Path(__file__).parent / "processed"
 
-    # Clean up old processed files before starting new job
-    for old_file in output_dir.glob("manga_page_*.png"):
-        old_file.unlink()
+# Recognized text of every processed page, searchable through /search
+TEXT_INDEX = TextIndex(PROCESSED_DIR / "text_index.sqlite3") if SERVER_PROCESS else None
 
-    font_path = "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc"
-    try:
-        ImageFont.truetype(font_path, 20)
-    except IOError:
-        font_path = "/System/Library/Fonts/PingFang.ttc"
+# Jobs share the loaded models; at most JOB_WORKERS run at once and JOB_QUEUE_SIZE may wait
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 4
 
-    pattern = str(downloads_dir / "manga_page_*.png")
-    image_files = sorted(glob.glob(pattern))
+# File in the output directory of a job without a chapter
+JOB_OUTPUT_MARKER = ".job"
 
-    if not image_files:
-        print(f"No files found in {downloads_dir}")
+
+def discard_job(job):
+    """A job without a chapter has its own output directory, which nothing reuses once it is forgotten"""
+    if job.chapter is not None:
         return
+    shutil.rmtree(job.output_dir, ignore_errors=True)
+    TEXT_INDEX.remove_chapter(job.output_dir.name)
 
-    if num_pages > 0:
-        image_files = image_files[:num_pages]
 
-    print(f"Processing {len(image_files)} file(s)...")
+def sweep_job_outputs():
+    """Remove the output of jobs without a chapter left by earlier runs of the server; no job refers to it any more"""
+    for marker in PROCESSED_DIR.glob(f"*/{JOB_OUTPUT_MARKER}"):
+        print(f"Removing the output of job {marker.parent.name}")
+        shutil.rmtree(marker.parent, ignore_errors=True)
+        TEXT_INDEX.remove_chapter(marker.parent.name)
 
-    # Reuse global extractor to avoid reloading models
-    if global_extractor is None:
-        print("Loading models...")
-        global_extractor = MangaTextExtractor()
-    else:
-        print("Reusing loaded models")
 
-    for i, image_path in enumerate(image_files, 1):
-        try:
-            print(f"[{i}/{len(image_files)}] Processing: {Path(image_path).name}")
-            process_image(image_path, global_extractor, font_path, output_dir)
+def finish_job(job):
+    """The last event of every job, also sent when it failed or was cancelled before it started"""
+    EVENTS.publish(
+        "done", job.id, progress=job.progress, total=job.total, cancelled=job.cancelled, status=job.status,
+        error=job.error
+    )
 
-            # Update global progress
-            processing_status["progress"] = i
-        except Exception as e:
-            print(f"  [ERROR] {image_path}: {e}")
-            import traceback
-            traceback.print_exc()
 
-    print(f"\n✓ Processing complete! {len(image_files)} page(s) processed")
-    print(f"  View at: http://localhost:5001/viewer\n")
-    processing_status["done"] = True
-    processing_status["is_processing"] = False
+JOBS = JobManager(
+    run_job, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, on_discard=discard_job, on_finish=finish_job
+) if SERVER_PROCESS else None
 
 
-# ----------------------------------------
-# Flask Endpoints
-# ----------------------------------------
+def job_counts():
+    counts = {}
+    for job in JOBS.list_jobs():
+        counts[job.status] = counts.get(job.status, 0) + 1
+    return {(("status", status),): n for status, n in counts.items()}
 
-@app.route('/', methods=['GET'])
-def health():
-    return "Manga Server is Running!"
 
+METRICS.describe("manga_jobs", "gauge", "Known jobs, by status", gauge=job_counts)
+METRICS.describe("manga_job_queue_depth", "gauge", "Jobs waiting for a job worker",
+                 gauge=lambda: {(): JOBS.queue_depth()})
+METRICS.describe("manga_write_queue_depth", "gauge", "Rendered pages waiting to be encoded",
+                 gauge=lambda: {(): PAGE_WRITER.pending})
 
-processing_status = {"is_processing": False, "progress": 0, "total": 0, "done": False}
-# Global extractor to reuse across requests (avoids reloading models)
-global_extractor = None
+# Uploaded pages allowed to wait for the pipeline of their job
+UPLOAD_QUEUE_SIZE = 8
+# Seconds an upload job waits for its next page before it fails
+UPLOAD_IDLE_TIMEOUT = 120
 
 @app.route('/run', methods=['POST'])
 def run_processing():
-    global processing_status
+    """Queue a job for the manga_page_*.png files in the Downloads folder"""
     data = request.get_json(silent=True) or {}
     num_pages = int(data.get("num_pages", 0))
+    try:
+        chapter = parse_chapter(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
 
-    # Reset status
-    processing_status = {"is_processing": True, "progress": 0, "total": num_pages, "done": False}
+    downloads_dir, image_files = find_downloaded_pages(num_pages)
+    if not image_files:
+        return jsonify({"status": "error", "error": f"No files found in {downloads_dir}"}), 404
 
-    # Run in background thread
-    thread = threading.Thread(target=main, args=(num_pages,))
-    thread.daemon = True
-    thread.start()
+    # A page limit processes only the start of the chapter
+    job = Job(len(image_files), PROCESSED_DIR, chapter=chapter, pages=image_files, complete=num_pages <= 0)
+    job, error = submit_job(job)
+    if error:
+        return error
 
-    return jsonify({"status": "started", "num_pages": num_pages})
+    return jsonify({"status": "started", "job_id": job.id, "num_pages": len(image_files)})
+
+@app.route('/upload/start', methods=['POST'])
+def start_upload():
+    """Queue a job whose pages are sent to /upload/page instead of being read from Downloads"""
+    data = request.get_json(silent=True) or {}
+    num_pages = int(data.get("num_pages", 0))
+    try:
+        chapter = parse_chapter(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    # The uploader says whether it sends every page of the chapter
+    job = Job(num_pages, PROCESSED_DIR, chapter=chapter, upload_queue_size=UPLOAD_QUEUE_SIZE,
+              idle_timeout=UPLOAD_IDLE_TIMEOUT, complete=bool(data.get("complete", False)))
+    job, error = submit_job(job)
+    if error:
+        return error
+
+    return jsonify({"status": "started", "job_id": job.id, "num_pages": num_pages})
+
+@app.route('/upload/page', methods=['POST'])
+def upload_page():
+    """Receive one page image (multipart field "page") and queue it for processing"""
+    job, error = find_job(request.form.get("job"))
+    if error:
+        return error
+    if job.upload_queue is None or not job.is_active:
+        return jsonify({"status": "error", "error": f"Job {job.id} is not accepting uploads"}), 409
+
+    file = request.files.get("page")
+    if file is None:
+        return jsonify({"status": "error", "error": "Missing 'page' file"}), 400
+
+    name = Path(file.filename or "").name
+    if not re.fullmatch(r"manga_page_\d+\.png", name):
+        return jsonify({"status": "error", "error": f"Invalid page name: {name}"}), 400
+
+    # Decode once here; the extractor and renderer work on this array
+    data = file.read()
+    try:
+        pixels = load_page(data)
+    except Exception as e:
+        return jsonify({"status": "error", "error": f"Failed to decode {name}: {e}"}), 400
+
+    # Blocks while the pipeline is busy, which throttles the uploader
+    if not job.add_page(PageInput(name, pixels=pixels, data=data)):
+        return jsonify({"status": "error", "error": f"Job {job.id} is no longer accepting uploads ({job.status})"}), 409
+    return jsonify({"status": "queued", "job_id": job.id, "page": name})
+
+@app.route('/upload/finish', methods=['POST'])
+def finish_upload():
+    """Signal that all pages of an upload job have been sent"""
+    data = request.get_json(silent=True) or {}
+    job, error = find_job(data.get("job"))
+    if error:
+        return error
+    if job.upload_queue is None:
+        return jsonify({"status": "error", "error": f"Job {job.id} is not an upload job"}), 409
+
+    job.finish_upload()
+    return jsonify({"status": "finished", "job_id": job.id})
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in JOBS.list_jobs()], "queued": JOBS.queue_depth()})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job, error = find_job(job_id)
+    if error:
+        return error
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """Extracted text and positions of every page of a job"""
+    job, error = find_job(job_id)
+    if error:
+        return error
+    return jsonify({"job_id": job.id, "pages": dict(sorted(job.results.items()))})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job, error = find_job(job_id)
+    if error:
+        return error
+    job.cancel()
+    return jsonify(job.to_dict())
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    """Server-Sent Events stream of per-page progress (detected, ocr_done, rendered, done)"""
+    return Response(
+        stream_with_context(EVENTS.stream(request.args.get("job"))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.route('/progress', methods=['GET'])
 def get_progress():
-    """Check processing progress"""
-    return jsonify(processing_status)
+    """Check processing progress of a job (the latest one by default)"""
+    job = JOBS.get(request.args.get("job"))
+    if job is None:
+        return jsonify({"is_processing": False, "progress": 0, "total": 0, "done": False})
+    return jsonify(job.to_dict())
 
 @app.route('/status', methods=['GET'])
 def get_status():
     """Check how many files are in downloads vs processed"""
-    downloads_dir = Path.home() / "Downloads"
-    if not downloads_dir.exists() or not os.access(downloads_dir, os.R_OK):
-        downloads_dir = Path(__file__).parent / "downloads"
-
-    output_dir = Path(__file__).parent / "processed"
+    downloads_dir, download_files = find_downloaded_pages()
 
-    download_files = sorted(downloads_dir.glob("manga_page_*.png"))
-    processed_files = sorted(output_dir.glob("manga_page_*.png"))
+    job = JOBS.get(request.args.get("job"))
+    processed_files = sorted(job.output_dir.glob(f"manga_page_*{OUTPUT_ENCODER.suffix}")) if job is not None else []
 
     return jsonify({
         "downloads_folder": str(downloads_dir),
         "downloads_count": len(download_files),
-        "downloads": [f.name for f in download_files],
+        "downloads": [Path(f).name for f in download_files],
         "processed_count": len(processed_files),
         "processed": [f.name for f in processed_files],
-        "processing": processing_status
+        "processing": job.to_dict() if job is not None else None,
+        "queued_jobs": JOBS.queue_depth(),
+        "text_index": TEXT_INDEX.stats(),
+        "ocr_memo": global_extractor.ocr_memo.stats() if global_extractor is not None and global_extractor.ocr_memo is not None else None
     })
 
+@app.route('/health', methods=['GET'])
+def get_health():
+    """Model readiness; 503 until the models can take jobs"""
+    state = dict(MODEL_STATE)
+    state["ready"] = state["status"] in ("loaded", "warming", "ready")
+    return jsonify(state), 200 if state["ready"] else 503
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of stage timings, page counts, cache hits and queue depths"""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/cache/clear', methods=['POST'])
+def clear_cache():
+    """Drop all cached extraction results"""
+    removed = RESULT_CACHE.invalidate()
+    variants = PAGE_VARIANTS.clear()
+    return jsonify({"status": "cleared", "removed": removed, "variants_removed": variants})
+
+@app.route('/search', methods=['GET'])
+def search_text():
+    """Find the bubbles containing a phrase (?q=...), optionally only in one chapter (?chapter=...)"""
+    query = request.args.get("q", "")
+    chapter = request.args.get("chapter")
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+
+    start = time.perf_counter()
+    matches = TEXT_INDEX.search(query, chapter=chapter, limit=limit)
+    took_ms = (time.perf_counter() - start) * 1000
+
+    return jsonify({"query": query, "matches": matches, "count": len(matches), "took_ms": round(took_ms, 2)})
+
+@lru_cache(maxsize=4096)
+def page_info(path, mtime_ns, size):
+    """Dimensions and content hash of one version of a rendered page (keyed by mtime and size)"""
+    with Image.open(path) as img:
+        width, height = img.size
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return {"width": width, "height": height, "bytes": size, "hash": h.hexdigest()[:16]}
+
+@app.route('/manifest', methods=['GET'])
+def get_manifest():
+    """
+    Rendered pages of a job with their dimensions, file sizes and content hashes, so the viewer
+    can plan prefetching. Poll it (or follow /events) while `done` is false to learn about new pages.
+    Takes ?job= or ?chapter=; page URLs name the chapter, so they keep working after a restart.
+    """
+    output_dir, job, error = find_output()
+    if error:
+        return error
+
+    pages = []
+    for f in sorted(output_dir.glob(f"manga_page_*{OUTPUT_ENCODER.suffix}")):
+        try:
+            stat = f.stat()
+            info = page_info(str(f), stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError):
+            # Removed or replaced while listing
+            continue
+        pages.append({
+            "name": f.name,
+            **info,
+            "url": f"/pages/{f.name}?chapter={output_dir.name}&v={info['hash']}",
+        })
+
+    if job is not None:
+        state = job.to_dict()
+    else:
+        # Rendered by an earlier run of the server
+        state = {"job_id": None, "status": "done", "chapter": output_dir.name, "is_processing": False, "done": True}
+    response = jsonify({**state, "pages": pages})
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.route('/pages', methods=['GET'])
 def get_pages():
-    output_dir = Path(__file__).parent / "processed"
-    files = sorted(output_dir.glob("manga_page_*.png"))
+    output_dir, job, error = find_output()
+    if error:
+        return jsonify({"pages": []})
+    files = sorted(output_dir.glob(f"manga_page_*{OUTPUT_ENCODER.suffix}"))
     filenames = [f.name for f in files]
-    return jsonify({"pages": filenames})
+    return jsonify({"job_id": job.id if job else None, "chapter": output_dir.name, "pages": filenames})
 
 @app.route('/pages/<filename>', methods=['GET'])
 def get_page_image(filename):
-    from flask import send_from_directory
-    output_dir = Path(__file__).parent / "processed"
-    return send_from_directory(str(output_dir), filename)
+    """
+    Serve a rendered page. The encoding is picked from ?format= or the Accept header (WebP when
+    accepted, AVIF on request; JPEG pages stay JPEG), and ?w= asks for a downscaled copy. Responses carry strong ETags
+    and support Range requests.
+    """
+    from flask import send_file
+    from werkzeug.security import safe_join
+    output_dir, _, error = find_output()
+    if error:
+        return error
+
+    source = safe_join(str(output_dir), filename)
+    if source is None or not os.path.isfile(source):
+        return jsonify({"status": "error", "error": f"Page not found: {filename}"}), 404
+
+    fmt = pick_format(request.args.get("format"), request.headers.get("Accept"), source)
+    width = pick_width(request.args.get("w", type=int))
+    try:
+        path, etag = PAGE_VARIANTS.get(source, fmt, width)
+    except Exception as e:
+        print(f"  [WARN] Could not encode {filename} as {fmt}: {e}")
+        return jsonify({"status": "error", "error": f"Could not encode {filename} as {fmt}"}), 500
+
+    response = send_file(path, mimetype=FORMATS[fmt][0], conditional=True, etag=etag)
+    stat = os.stat(source)
+    if request.args.get("v") == page_info(source, stat.st_mtime_ns, stat.st_size)["hash"]:
+        # The URL names this exact version of the page (see /manifest), so it never changes
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        # Pages are rewritten in place when a chapter is reprocessed, so clients revalidate with the ETag
+        response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept"
+    return response
 
 @app.route('/viewer', methods=['GET'])
 def viewer():
     """Simple HTML viewer for processed images"""
-    output_dir = Path(__file__).parent / "processed"
-    files = sorted(output_dir.glob("manga_page_*.png"))
+    output_dir, _, error = find_output()
+    if error:
+        return error
+    files = sorted(output_dir.glob(f"manga_page_*{OUTPUT_ENCODER.suffix}"))
 
     html = """
     <!DOCTYPE html>
@@ -344,7 +702,7 @@ def viewer():
     """
 
     for f in files:
-        html += f'<img src="/pages/{f.name}" alt="{f.name}"><br>\n'
+        html += f'<img src="/pages/{f.name}?chapter={output_dir.name}" alt="{f.name}"><br>\n'
 
     html += """
     </body>
@@ -355,4 +713,9 @@ def viewer():
 
 
 if __name__ == '__main__':
+    sweep_job_outputs()
+    # Fonts and models load in the background so the server answers (and /health reports) right away
+    threading.Thread(target=warm_fonts, name="font-loader", daemon=True).start()
+    if PRELOAD_MODELS:
+        threading.Thread(target=preload_models, name="model-loader", daemon=True).start()
     app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
@@ -0,0 +1,191 @@
+import json
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+# File extension of result sidecars written next to pages and in the result cache
+SIDECAR_SUFFIX = ".mtr"
+
+_MAGIC = b"MTR1"
+_HEADER_LENGTH = struct.Struct("<I")
+
+# Per-bubble fields stored as packed little-endian arrays: name -> (array typecode, values per bubble)
+_PACKED = {
+    "position": ("i", 4),
+    "fg_color": ("B", 3),
+    "bg_color": ("B", 3),
+}
+
+# Fields returned as tuples, like in extract() output
+_TUPLE_KEYS = ("position", "fg_color", "bg_color")
+
+
+def _to_bytes(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _packed_lines(results):
+    """
+    Flatten the text line polygons into one float32 array plus a line count per bubble.
+
+    Returns None when some polygon is not a quadrilateral, in which case `lines` is stored as JSON.
+    """
+    counts = array("I")
+    coords = array("f")
+    for item in results:
+        lines = item["lines"]
+        for polygon in lines:
+            if len(polygon) != 4 or any(len(point) != 2 for point in polygon):
+                return None
+            for x, y in polygon:
+                coords.append(x)
+                coords.append(y)
+        counts.append(len(lines))
+    return counts, coords
+
+
+def dumps(results):
+    """
+    Encode one page's results in the compact sidecar format.
+
+    Layout: the magic bytes "MTR1", the length of a JSON header, the header itself, then the
+    packed arrays it lists. Text and other scalar fields are stored column by column in the
+    header; positions and colours are packed integer arrays and the text line polygons one
+    float32 array of (x, y) points with a line count per bubble.
+
+    Args:
+        results (list[dict]): Results as returned by MangaTextExtractor.extract.
+
+    Returns:
+        bytes: Encoded sidecar.
+    """
+    keys = []
+    for item in results:
+        for key in item:
+            if key not in keys:
+                keys.append(key)
+
+    columns = {}
+    sparse = []
+    arrays = []
+    for key in keys:
+        present = all(key in item for item in results)
+        if not present:
+            sparse.append(key)
+
+        if present and key in _PACKED:
+            typecode, width = _PACKED[key]
+            values = [int(v) for item in results for v in item[key]]
+            if all(len(item[key]) == width for item in results):
+                arrays.append((key, typecode, array(typecode, values)))
+                continue
+
+        if present and key == "lines":
+            packed = _packed_lines(results)
+            if packed is not None:
+                arrays.append(("line_counts", "I", packed[0]))
+                arrays.append(("lines", "f", packed[1]))
+                continue
+
+        columns[key] = [item.get(key) for item in results]
+
+    blobs = [_to_bytes(values) for _, _, values in arrays]
+    header = json.dumps({
+        "count": len(results),
+        "keys": keys,
+        "sparse": sparse,
+        "columns": columns,
+        "arrays": [[name, typecode, len(blob)] for (name, typecode, _), blob in zip(arrays, blobs)],
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    return b"".join([_MAGIC, _HEADER_LENGTH.pack(len(header)), header] + blobs)
+
+
+def loads(data):
+    """
+    Decode a sidecar produced by `dumps`.
+
+    Args:
+        data (bytes): Encoded sidecar.
+
+    Returns:
+        list[dict]: The results, with position and colours as tuples and lines as nested lists.
+
+    Raises:
+        ValueError: If `data` is not a sidecar.
+    """
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("Not a result sidecar")
+    offset = len(_MAGIC)
+    (header_length,) = _HEADER_LENGTH.unpack_from(data, offset)
+    offset += _HEADER_LENGTH.size
+    header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+    offset += header_length
+
+    arrays = {}
+    for name, typecode, length in header["arrays"]:
+        arrays[name] = _from_bytes(typecode, data[offset:offset + length])
+        offset += length
+    if offset != len(data):
+        raise ValueError("Truncated or corrupt sidecar")
+
+    count = header["count"]
+    columns = header["columns"]
+    for key, (typecode, width) in _PACKED.items():
+        if key in arrays:
+            values = arrays[key]
+            columns[key] = [values[i * width:(i + 1) * width].tolist() for i in range(count)]
+
+    if "lines" in arrays:
+        coords = arrays["lines"].tolist()
+        lines = []
+        start = 0
+        for line_count in arrays["line_counts"]:
+            end = start + line_count * 8
+            points = coords[start:end]
+            lines.append([
+                [points[p:p + 2] for p in range(q, q + 8, 2)]
+                for q in range(0, end - start, 8)
+            ])
+            start = end
+        columns["lines"] = lines
+
+    sparse = set(header["sparse"])
+    results = []
+    for i in range(count):
+        item = {}
+        for key in header["keys"]:
+            value = columns[key][i]
+            if value is None and key in sparse:
+                continue
+            item[key] = tuple(value) if key in _TUPLE_KEYS and value is not None else value
+        results.append(item)
+    return results
+
+
+def write(path, results):
+    """
+    Write a sidecar file atomically (a partially written file is never visible at `path`).
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(dumps(results))
+    os.replace(tmp_path, path)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
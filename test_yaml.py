@@ -1,15 +1,15 @@
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
-import yaml
 import os
 
-# extraction is done via yaml file now
+import sidecar
+
+# extraction is done via the sidecar file written by text_extracter_yaml.py
 image_path = "/Users/mizuho/HenHacks2026/image.png"
-yaml_path = os.path.splitext(image_path)[0] + ".yaml"
+sidecar_path = os.path.splitext(image_path)[0] + sidecar.SIDECAR_SUFFIX
 
-print(f"Loading metadata from {yaml_path}...")
-with open(yaml_path, "r", encoding="utf-8") as f:
-    results = yaml.safe_load(f)
+print(f"Loading metadata from {sidecar_path}...")
+results = sidecar.read(sidecar_path)
 
 # Open original image
 img = Image.open(image_path).convert("RGB")
@@ -0,0 +1,31 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("cv2")
+pytest.importorskip("numpy")
+
+from inpainting import Inpainter
+
+
+def test_over_budget_pages_give_every_slot_back():
+    inpainter = Inpainter(workers=4, budget=0.002)
+
+    def slow_bubble(page, position, mask):
+        time.sleep(0.001)
+        return False
+
+    inpainter._inpaint_bubble = slow_bubble
+    positions = [(0, 0, 10, 10)] * 16
+    for _ in range(300):
+        assert inpainter.inpaint(None, positions, None) == set()
+    inpainter.shutdown()
+
+    # Every acquired slot is released again, whether its bubble ran, was skipped or was cancelled
+    for _ in range(4):
+        assert inpainter._slots.acquire(blocking=False)
+    assert not inpainter._slots.acquire(blocking=False)
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ocr_memo import OcrMemo
+
+
+def test_exact_only_memo_misses_unknown_fingerprint():
+    memo = OcrMemo(max_entries=4, max_distance=0)
+    assert memo.get((0, 2)) is None
+    assert memo.stats() == {"hits": 0, "misses": 1, "entries": 0}
+
+
+def test_exact_only_memo_ignores_near_matches():
+    memo = OcrMemo(max_entries=4, max_distance=0)
+    memo.put((0, 0b1010), "あ")
+    assert memo.get((0, 0b1010)) == "あ"
+    assert memo.get((0, 0b1011)) is None
+
+
+def test_fuzzy_memo_reuses_near_matches():
+    memo = OcrMemo(max_entries=4, max_distance=1)
+    memo.put((0, 0b1010), "あ")
+    assert memo.get((0, 0b1011)) == "あ"
+    assert memo.get((1, 0b1010)) is None
@@ -1,4 +1,5 @@
 import sys
+import threading
 from pathlib import Path
 
 # Add comic-text-detector folder to path to allow import
@@ -6,15 +7,84 @@ sys.path.append(str(Path(__file__).parent / "comic-text-detector"))
 
 import cv2
 import numpy as np
-import PIL.Image
+import torch
 from manga_ocr import MangaOcr
+from manga_ocr.ocr import post_process
 
 # Import Comic Text Detector
 from inference import TextDetector
+from basemodel import TextDetBase
+
+from ocr_memo import OcrMemo, crop_fingerprint
+from page_image import crop_bubble, load_page, text_density
+from metrics import METRICS
+
+OCR_MODEL_NAME = "kha-white/manga-ocr-base"
+
+# "eager": stock PyTorch models.
+# "int8": manga-ocr with int8 dynamically quantized Linear layers; the detector stays eager.
+# "onnx": the detector as an ONNX graph run by OpenCV DNN, plus the int8 manga-ocr.
+INFERENCE_BACKENDS = ("eager", "int8", "onnx")
+
+# Detector input sizes tried in adaptive mode, smallest first. The detector letterboxes to a
+# stride of 64, so every size is a multiple of it; the last one is the full resolution.
+ADAPTIVE_INPUT_SIZES = (640, 768, 1024)
+
+# Share of edge pixels in a small thumbnail above which a page counts as text-dense
+DENSE_PAGE_EDGES = 0.08
+
+# Text smaller than this (in detector input pixels) is re-detected on a crop at the full resolution's scale
+MIN_DETECTOR_TEXT_PX = 12
+
+# Context (in full resolution detector input pixels) kept around the blocks of such a crop
+CROP_MARGIN_PX = 32
+
+# Share of the segmented text pixels outside every detected text line above which a low
+# resolution pass is taken to have missed text, and the page is detected again at full resolution
+MAX_UNCOVERED_TEXT = 0.1
+
+# Margin (in detector input pixels) around each text line that still counts as covering the text mask
+LINE_MARGIN_PX = 4
+
+
+def export_detector_onnx(model_path, onnx_path, input_size=1024):
+    """
+    Export the comic-text-detector PyTorch weights to an ONNX graph for OpenCV DNN.
+
+    Args:
+        model_path (str or Path): comictextdetector.pt weights.
+        onnx_path (str or Path): Where to write the graph.
+        input_size (int): Side of the square input the graph is traced with.
+    """
+    net = TextDetBase(str(model_path), device="cpu", act="leaky")
+    net.eval()
+    dummy = torch.zeros(1, 3, input_size, input_size)
+    with torch.no_grad():
+        torch.onnx.export(
+            net, dummy, str(onnx_path),
+            input_names=["images"],
+            output_names=["blk", "seg", "det"],
+            opset_version=11,
+        )
+    print(f"Exported detector to {onnx_path}")
+
+
+def quantize_ocr_model(model):
+    """
+    Return manga-ocr's encoder-decoder with every Linear layer dynamically quantized to int8.
+
+    Nearly all of the per-bubble OCR time is spent in the Linear layers of the ViT encoder
+    and the BERT decoder, which int8 runs on with integer matrix kernels on the CPU.
+    """
+    if "fbgemm" not in torch.backends.quantized.supported_engines:
+        # ARM CPUs (Apple silicon) only have the qnnpack kernels
+        torch.backends.quantized.engine = "qnnpack"
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
 
 
 class MangaTextExtractor:
-    def __init__(self, detector_model_path=None, device='cpu'):
+    def __init__(self, detector_model_path=None, device='cpu', ocr_batch_size=16,
+                 ocr_memo_size=2048, ocr_memo_distance=8, backend="eager", adaptive_input=False):
         """
         Initialize the MangaTextExtractor by loading the models.
         
@@ -22,7 +92,30 @@ class MangaTextExtractor:
             detector_model_path (str, optional): Path to the comic-text-detector model file.
                                                  Defaults to 'comic-text-detector/comictextdetector.pt' in the project directory.
             device (str): Device to run the detector on ('cpu' or 'cuda'). Defaults to 'cpu'.
+            ocr_batch_size (int): Maximum number of bubble crops sent to manga-ocr in one forward pass. Defaults to 16.
+            ocr_memo_size (int): Number of recognized bubbles remembered for reuse. 0 disables the memo. Defaults to 2048.
+            ocr_memo_distance (int): Maximum fingerprint distance for a crop to reuse a remembered text. Defaults to 8.
+            backend (str): Inference backend, one of INFERENCE_BACKENDS. Defaults to "eager".
+                           With "onnx", the detector graph is read from '<detector_model_path>.onnx' (unless
+                           detector_model_path already is a .onnx file) and exported there first if missing.
+            adaptive_input (bool): Pick the detector input size per page from ADAPTIVE_INPUT_SIZES instead of always
+                                   using 1024. Not available with the "onnx" backend, whose graph has a fixed size.
         """
+        if ocr_batch_size < 1:
+            raise ValueError(f"ocr_batch_size must be at least 1, got {ocr_batch_size}")
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"backend must be one of {INFERENCE_BACKENDS}, got {backend!r}")
+        self.ocr_batch_size = ocr_batch_size
+        self.backend = backend
+        self.device = device
+
+        # Jobs running in parallel share the models; each model runs one call at a time
+        self._detector_lock = threading.Lock()
+        self._ocr_lock = threading.Lock()
+
+        # Repeated bubbles (SFX, "…", catchphrases) reuse earlier OCR results
+        self.ocr_memo = OcrMemo(ocr_memo_size, ocr_memo_distance) if ocr_memo_size > 0 else None
+
         if detector_model_path is None:
             # Default path relative to this script
             base_path = Path(__file__).parent / "comic-text-detector"
@@ -32,52 +125,302 @@ class MangaTextExtractor:
         if not Path(detector_model_path).exists():
              raise FileNotFoundError(f"Model file not found: {detector_model_path}")
 
+        self.input_size = 1024
+        if backend == "onnx" and Path(detector_model_path).suffix != ".onnx":
+            onnx_path = Path(f"{detector_model_path}.onnx")
+            if not onnx_path.exists():
+                export_detector_onnx(detector_model_path, onnx_path, self.input_size)
+            detector_model_path = str(onnx_path)
+        self.detector_model_path = detector_model_path
+
+        if adaptive_input and Path(detector_model_path).suffix == ".onnx":
+            print("Adaptive detector input is not available for ONNX graphs; using a fixed input size")
+            adaptive_input = False
+        self.adaptive_input = adaptive_input
+        # Page sizes (height, width) whose last page needed a full resolution pass over the whole page
+        self._full_resolution_shapes = set()
+
+        # Identifies the weights in use, so cached results from other models are never reused
+        detector_stat = Path(detector_model_path).stat()
+        self.model_identity = f"{Path(detector_model_path).name}:{detector_stat.st_size}:{int(detector_stat.st_mtime)}|{OCR_MODEL_NAME}|{backend}"
+        if adaptive_input:
+            self.model_identity += "|adaptive:" + ",".join(map(str, ADAPTIVE_INPUT_SIZES)) + "|refine:crop"
+
         print("Loading MangaOCR model...")
-        self.mocr = MangaOcr()
+        self.mocr = MangaOcr(OCR_MODEL_NAME)
+        if backend != "eager":
+            self.mocr.model = quantize_ocr_model(self.mocr.model)
         
-        print("Loading TextDetector model...")
-        # Initialization of TextDetector
-        # Note: TextDetector requires 'act' parameter to be 'leaky' for this specific model
-        self.text_detector = TextDetector(model_path=detector_model_path, input_size=1024, device=device, act='leaky')
+        print(f"Loading TextDetector model ({backend})...")
+        self.text_detector = self._load_detector()
+        if adaptive_input:
+            self._warm_detector()
         print("Models loaded successfully.")
 
-    def _get_boxes_from_detector(self, img_path):
+    def _load_detector(self):
+        # Initialization of TextDetector; a .onnx path makes it use OpenCV DNN instead of PyTorch
+        # Note: TextDetector requires 'act' parameter to be 'leaky' for this specific model
+        return TextDetector(model_path=self.detector_model_path, input_size=self.input_size, device=self.device, act='leaky')
+
+    def _warm_detector(self):
+        # Run every adaptive size once so the first real pages don't pay for the allocations
+        blank = np.full((64, 64, 3), 255, dtype=np.uint8)
+        for size in ADAPTIVE_INPUT_SIZES:
+            self._run_detector(blank, size)
+
+    def warm_up(self):
+        """
+        Run one detection and one OCR batch on a blank page.
+
+        The first forward passes of each model pay for lazy initialization and buffer allocations;
+        calling this once after loading keeps that cost off the first real page.
+        """
+        blank = np.full((256, 256, 3), 255, dtype=np.uint8)
+        # In adaptive mode every input size was already run while loading
+        if not self.adaptive_input:
+            self._run_detector(blank, self.input_size)
+        self._recognize_batch([crop_bubble(blank, (0, 0, 64, 64))])
+
+    def _run_detector(self, img, input_size):
+        """
+        Run the detector on a BGR page letterboxed to `input_size`.
+
+        Returns:
+            tuple: (numpy.ndarray, numpy.ndarray, list[TextBlock]) The raw segmentation mask and the
+                   refined text mask (both uint8, page sized) and the detected blocks.
+        """
+        # Runs that share the detector also share its input size, so both change under the lock
+        with self._detector_lock, METRICS.time("manga_stage_seconds", stage="detect"):
+            self.text_detector.input_size = (input_size, input_size)
+            mask, mask_refined, blk_list = self.text_detector(img)
+        return mask, mask_refined, blk_list
+
+    def _choose_input_size(self, img):
+        """
+        Detector input size for a page in adaptive mode.
+
+        Pages smaller than a size never get upscaled to it, and text-dense pages start one size
+        above the smallest that would otherwise do.
+        """
+        long_side = max(img.shape[:2])
+        covering = [size for size in ADAPTIVE_INPUT_SIZES if size >= long_side]
+        limit = covering[0] if covering else ADAPTIVE_INPUT_SIZES[-1]
+        candidates = [size for size in ADAPTIVE_INPUT_SIZES if size <= limit]
+
+        if len(candidates) > 1 and text_density(img) > DENSE_PAGE_EDGES:
+            return candidates[1]
+        return candidates[0]
+
+    @staticmethod
+    def _missed_text(blk_list, mask, scale):
+        """
+        Whether a low resolution pass missed text altogether.
+
+        The segmentation mask marks text pixels independently of the block and line detection, so
+        text it sees that no detected line covers is text the low resolution pass did not pick up.
+
+        Args:
+            blk_list (list[TextBlock]): Blocks found at the low resolution.
+            mask (numpy.ndarray): Raw segmentation mask of that pass, page sized.
+            scale (float): Detector input pixels per page pixel in that pass.
+        """
+        text = mask > 127
+        text_pixels = np.count_nonzero(text)
+        if text_pixels == 0:
+            return False
+
+        covered = np.zeros(mask.shape[:2], np.uint8)
+        polygons = [np.round(line).astype(np.int32) for blk in blk_list for line in blk.lines_array()]
+        if polygons:
+            cv2.fillPoly(covered, polygons, 1)
+            cv2.polylines(covered, polygons, True, 1, thickness=max(1, round(2 * LINE_MARGIN_PX / scale)))
+        uncovered = np.count_nonzero(text & (covered == 0))
+        return uncovered / text_pixels > MAX_UNCOVERED_TEXT
+
+    @staticmethod
+    def _block_center(blk, offset=(0, 0)):
+        xmin, ymin, xmax, ymax = blk.xyxy
+        return (xmin + xmax) / 2 + offset[0], (ymin + ymax) / 2 + offset[1]
+
+    def _detect_adaptive(self, img):
+        """
+        Detect a page at the smallest input size that suits it, then refine where that was not enough.
+
+        A pass that missed text is redone on the whole page at full resolution. Blocks whose
+        lettering came out too small to trust are detected again on a crop around them, at the
+        smallest size that gives the crop at least the full resolution's scale, so the few small
+        captions of a page don't cost a second full pass. Pages of a chapter share their size and
+        lettering, so once a page needed the whole page at full resolution, the following pages
+        of that size start there until their lettering is large enough for the small size again.
+
+        Returns:
+            tuple: (list[tuple], numpy.ndarray) (TextBlock, (x, y) offset of the pass that found it)
+                   pairs and the refined text mask, page sized.
+        """
+        shape = img.shape[:2]
+        long_side = max(shape)
+        input_size = self._choose_input_size(img)
+        scale = input_size / long_side
+        if input_size >= self.input_size:
+            _, mask, blk_list = self._run_detector(img, input_size)
+            return [(blk, (0, 0)) for blk in blk_list], mask
+
+        if shape in self._full_resolution_shapes:
+            _, mask, blk_list = self._run_detector(img, self.input_size)
+            if blk_list and all(blk.font_size * scale >= MIN_DETECTOR_TEXT_PX for blk in blk_list):
+                self._full_resolution_shapes.discard(shape)
+            return [(blk, (0, 0)) for blk in blk_list], mask
+
+        raw_mask, mask, blk_list = self._run_detector(img, input_size)
+
+        missed = self._missed_text(blk_list, raw_mask, scale)
+        # Lettering only a few input pixels high is where the small sizes start to miss lines
+        tiny = [blk for blk in blk_list if blk.font_size * scale < MIN_DETECTOR_TEXT_PX]
+        if not missed and not tiny:
+            return [(blk, (0, 0)) for blk in blk_list], mask
+
+        crop = None if missed else self._refinement_crop(img, blk_list, tiny)
+        if crop is None:
+            METRICS.inc("manga_detect_refinements_total", kind="page")
+            if len(self._full_resolution_shapes) >= 64:
+                self._full_resolution_shapes.clear()
+            self._full_resolution_shapes.add(shape)
+            _, mask, blk_list = self._run_detector(img, self.input_size)
+            return [(blk, (0, 0)) for blk in blk_list], mask
+
+        (x0, y0, x1, y1), crop_size, replaced, in_core = crop
+        METRICS.inc("manga_detect_refinements_total", kind="crop")
+        _, crop_mask, crop_blocks = self._run_detector(np.ascontiguousarray(img[y0:y1, x0:x1]), crop_size)
+        mask = mask.copy()
+        mask[y0:y1, x0:x1] = crop_mask
+
+        replaced_ids = {id(blk) for blk in replaced}
+        blocks = [(blk, (0, 0)) for blk in blk_list if id(blk) not in replaced_ids]
+        blocks += [(blk, (x0, y0)) for blk in crop_blocks if in_core(self._block_center(blk, (x0, y0)))]
+        return blocks, mask
+
+    def _refinement_crop(self, img, blk_list, tiny):
+        """
+        Region of the page to detect the `tiny` blocks again in, or None when only a full pass will do.
+
+        The blocks centred among the tiny ones are replaced by what the crop finds there, so the crop
+        holds all of them whole.
+
+        Returns:
+            tuple: ((x0, y0, x1, y1) crop, detector input size for it, replaced TextBlocks, in_core(center) test).
+        """
+        core = (
+            min(blk.xyxy[0] for blk in tiny), min(blk.xyxy[1] for blk in tiny),
+            max(blk.xyxy[2] for blk in tiny), max(blk.xyxy[3] for blk in tiny),
+        )
+
+        def in_core(center):
+            return core[0] <= center[0] <= core[2] and core[1] <= center[1] <= core[3]
+
+        replaced = [blk for blk in blk_list if in_core(self._block_center(blk))]
+        height, width = img.shape[:2]
+        long_side = max(height, width)
+        margin = CROP_MARGIN_PX * long_side / self.input_size
+        x0 = max(0, int(min(blk.xyxy[0] for blk in replaced) - margin))
+        y0 = max(0, int(min(blk.xyxy[1] for blk in replaced) - margin))
+        x1 = min(width, int(max(blk.xyxy[2] for blk in replaced) + margin) + 1)
+        y1 = min(height, int(max(blk.xyxy[3] for blk in replaced) + margin) + 1)
+
+        needed = max(x1 - x0, y1 - y0) * self.input_size / long_side
+        crop_size = next((size for size in ADAPTIVE_INPUT_SIZES if size >= needed), self.input_size)
+        if crop_size >= self.input_size:
+            # The crop would cost as much as the whole page
+            return None
+        return (x0, y0, x1, y1), crop_size, replaced, in_core
+
+    def share_memory(self):
+        """
+        Move the model weights to shared memory so that worker processes can use them without copying.
+
+        Only parameters and buffers can be shared. The int8 Linear layers of the quantized backends
+        keep their weights in packed form outside of those, so every worker receives its own copy.
+
+        Returns:
+            tuple: (shared_bytes, copied_bytes) Weight bytes shared with the workers and weight bytes
+                   that each worker gets a copy of.
+        """
+        models = [self.mocr.model]
+        if isinstance(self.text_detector.net, torch.nn.Module):
+            models.append(self.text_detector.net)
+
+        shared_bytes = copied_bytes = 0
+        for model in models:
+            model.share_memory()
+            for tensor in list(model.parameters()) + list(model.buffers()):
+                shared_bytes += tensor.numel() * tensor.element_size()
+            for module in model.modules():
+                if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+                    weight = module.weight()
+                    copied_bytes += weight.numel() * weight.element_size()
+        return shared_bytes, copied_bytes
+
+    def __getstate__(self):
+        # Locks and the OCR memo are per process; workers start with fresh ones
+        state = self.__dict__.copy()
+        del state["_detector_lock"], state["_ocr_lock"]
+        if self.ocr_memo is not None:
+            state["ocr_memo"] = (self.ocr_memo.max_entries, self.ocr_memo.max_distance)
+        if self.backend == "onnx":
+            # OpenCV DNN networks cannot be pickled; workers read the graph file themselves
+            state["text_detector"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._detector_lock = threading.Lock()
+        self._ocr_lock = threading.Lock()
+        if self.ocr_memo is not None:
+            self.ocr_memo = OcrMemo(*self.ocr_memo)
+        if self.text_detector is None:
+            self.text_detector = self._load_detector()
+
+    def _get_boxes_from_detector(self, img):
         """
         Internal helper to get coordinates using Comic Text Detector.
+
+        `img` is a BGR page array from `load_page`, or anything `load_page` accepts.
+        Returns the bubble metadata and the detector's refined text mask of the page.
         """
-        # Read image with OpenCV
-        img = cv2.imread(str(img_path))
-        if img is None:
-            raise FileNotFoundError(f"Image not found: {img_path}")
-        
+        img = load_page(img)
+
         # Run inference to get speech bubble information
-        # TextDetector returns (mask, mask_refined, blk_list)
-        _, _, blk_list = self.text_detector(img)
+        if self.adaptive_input:
+            blocks, mask = self._detect_adaptive(img)
+        else:
+            _, mask, blk_list = self._run_detector(img, self.input_size)
+            blocks = [(blk, (0, 0)) for blk in blk_list]
         
         formatted_boxes = []
         
-        # Extract coordinates from TextBlock
-        for blk in blk_list:
+        # Extract coordinates from TextBlock; blocks found on a crop are moved back to page coordinates
+        for blk, (dx, dy) in blocks:
             # blk.xyxy is in the format [xmin, ymin, xmax, ymax]
             xmin, ymin, xmax, ymax = map(int, blk.xyxy)
+
+            # Plain Python types so results can be cached and returned as JSON
             formatted_boxes.append({
-                "position": (xmin, ymin, xmax, ymax),
-                "font_size": blk.font_size,
-                "lines": blk.lines_array().tolist(),
-                "angle": blk.angle,
-                "vertical": blk.vertical,
-                "fg_color": (blk.fg_r, blk.fg_g, blk.fg_b),
-                "bg_color": (blk.bg_r, blk.bg_g, blk.bg_b)
+                "position": (xmin + dx, ymin + dy, xmax + dx, ymax + dy),
+                "font_size": float(blk.font_size),
+                "lines": [[[x + dx, y + dy] for x, y in line] for line in blk.lines_array().tolist()],
+                "angle": int(blk.angle),
+                "vertical": bool(blk.vertical),
+                "fg_color": (int(blk.fg_r), int(blk.fg_g), int(blk.fg_b)),
+                "bg_color": (int(blk.bg_r), int(blk.bg_g), int(blk.bg_b))
             })
                 
-        return formatted_boxes
+        return formatted_boxes, mask
 
     def extract(self, image_path):
         """
         Extract text from a manga page image.
 
         Args:
-            image_path (str or Path): Path to the image file.
+            image_path (str, Path, bytes, PIL.Image or numpy.ndarray): The page, in any form `load_page` accepts.
 
         Returns:
             list[dict]: A list of dictionaries containing detected text and position.
@@ -96,42 +439,129 @@ class MangaTextExtractor:
                             ...
                         ]
         """
-        image_path = str(image_path) # Ensure path is string for cv2 and PIL
-        
-        # Read the original image with Pillow for cropping
-        try:
-            original_img = PIL.Image.open(image_path)
-        except Exception as e:
-            raise IOError(f"Failed to open image {image_path}: {e}")
-        
-        # 1. Get all speech bubble coordinates (positions) and metadata
-        bubble_data_list = self._get_boxes_from_detector(image_path) 
-        
-        results = []
-        
-        # 2. Loop through and process the number of found speech bubbles
-        for i, data in enumerate(bubble_data_list):
-            box = data["position"]
-            # Crop only the speech bubble part using the coordinates
-            cropped_img = original_img.crop(box)
-            
-            # Pass the cropped image to manga-ocr to recognize text
-            text = self.mocr(cropped_img)
-            
-            # Save position information and text
-            results.append({
-                "id": i,
-                "position": box,
-                "font_size": data["font_size"],
-                # "lines": data["lines"],
-                "angle": data["angle"],
-                "vertical": data["vertical"],
-                "fg_color": data["fg_color"],
-                "bg_color": data["bg_color"],
-                "text": text
-            })
-            
-        return results
+        return self.extract_pages([image_path])[0]
+
+    def extract_pages(self, image_paths):
+        """
+        Extract text from several manga pages, recognizing all of their bubbles together.
+
+        Crops from every page are pooled before OCR so that batches stay full even when
+        individual pages only have a handful of bubbles.
+
+        Args:
+            image_paths (list): Pages in any form `load_page` accepts.
+
+        Returns:
+            list[list[dict]]: One result list per page, in the same format as `extract`.
+        """
+        return self.recognize([self.detect(image_path) for image_path in image_paths])
+
+    def detect(self, image_path, with_mask=False):
+        """
+        Run only the text detector on a page.
+
+        Args:
+            image_path (str, Path, bytes, PIL.Image or numpy.ndarray): The page, in any form `load_page` accepts.
+                                                                       Pass the array from `load_page` to avoid decoding again.
+            with_mask (bool): Also return the detector's refined text mask, used for inpainting.
+
+        Returns:
+            tuple: (numpy.ndarray, list[dict]) The decoded BGR page and the bubble metadata from the detector,
+                   followed by the page-sized uint8 text mask when `with_mask` is set.
+        """
+        page = load_page(image_path)
+        boxes, mask = self._get_boxes_from_detector(page)
+        if with_mask:
+            return page, boxes, mask
+        return page, boxes
+
+    def recognize(self, detections):
+        """
+        Run OCR on the bubbles of one or more detected pages.
+
+        Args:
+            detections (list[tuple]): (numpy.ndarray, list[dict]) pairs as returned by `detect`.
+
+        Returns:
+            list[list[dict]]: One result list per page, in the same format as `extract`.
+        """
+        # Crop only the speech bubble parts using the coordinates
+        crops = [
+            crop_bubble(page, data["position"])
+            for page, bubble_data_list in detections
+            for data in bubble_data_list
+        ]
+
+        # Pass all cropped images to manga-ocr to recognize text
+        texts = iter(self._recognize(crops))
+
+        all_results = []
+        for _, bubble_data_list in detections:
+            results = []
+            for i, data in enumerate(bubble_data_list):
+                # Save position information and text
+                results.append({
+                    "id": i,
+                    "position": data["position"],
+                    "font_size": data["font_size"],
+                    "lines": data["lines"],
+                    "angle": data["angle"],
+                    "vertical": data["vertical"],
+                    "fg_color": data["fg_color"],
+                    "bg_color": data["bg_color"],
+                    "text": next(texts)
+                })
+            all_results.append(results)
+
+        return all_results
+
+    def _recognize(self, crops):
+        """
+        Run manga-ocr on a list of cropped bubble images, at most `ocr_batch_size` at a time.
+
+        Crops that match a remembered bubble are answered from the OCR memo and never reach the model.
+        """
+        texts = [None] * len(crops)
+        fingerprints = [None] * len(crops)
+
+        if self.ocr_memo is not None:
+            for i, crop in enumerate(crops):
+                fingerprints[i] = crop_fingerprint(crop)
+                texts[i] = self.ocr_memo.get(fingerprints[i])
+                METRICS.inc("manga_ocr_memo_total", result="miss" if texts[i] is None else "hit")
+
+        missing = [i for i, text in enumerate(texts) if text is None]
+        for start in range(0, len(missing), self.ocr_batch_size):
+            indices = missing[start:start + self.ocr_batch_size]
+            batch_texts = self._recognize_batch([crops[i] for i in indices])
+            for i, text in zip(indices, batch_texts):
+                texts[i] = text
+                if self.ocr_memo is not None:
+                    self.ocr_memo.put(fingerprints[i], text)
+
+        return texts
+
+    def _recognize_batch(self, crops):
+        """
+        Batched equivalent of MangaOcr.__call__.
+
+        The ViT processor resizes every crop to the same input size, so the encoder batch is
+        a plain stack; generate() pads finished sequences, and the padding is dropped again
+        by skip_special_tokens when decoding.
+        """
+        # Same preprocessing as MangaOcr.__call__ (grayscale, then back to RGB); crops are already grayscale
+        pixel_values = torch.stack([
+            self.mocr._preprocess(crop.convert("RGB")) for crop in crops
+        ])
+
+        METRICS.inc("manga_ocr_crops_total", len(crops))
+        with self._ocr_lock, METRICS.time("manga_stage_seconds", stage="ocr_batch"):
+            token_ids = self.mocr.model.generate(pixel_values.to(self.mocr.model.device), max_length=300).cpu()
+
+        return [
+            post_process(self.mocr.tokenizer.decode(ids, skip_special_tokens=True))
+            for ids in token_ids
+        ]
 
 if __name__ == "__main__":
     # Specify image path for hackathon
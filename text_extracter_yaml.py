@@ -8,7 +8,8 @@ import cv2
 import numpy as np
 import PIL.Image
 from manga_ocr import MangaOcr
-import yaml
+
+import sidecar
 
 # Import Comic Text Detector
 from inference import TextDetector
@@ -62,7 +63,6 @@ class MangaTextExtractor:
             # blk.xyxy is in the format [xmin, ymin, xmax, ymax]
             xmin, ymin, xmax, ymax = map(int, blk.xyxy)
             
-            # To avoid yaml tagging tuples as python/tuple, convert all tuples to lists
             formatted_boxes.append({
                 "position": [xmin, ymin, xmax, ymax],  # Bounding box coordinates [xmin, ymin, xmax, ymax]
                 "font_size": int(blk.font_size),       # Estimated font size
@@ -157,16 +157,14 @@ if __name__ == "__main__":
         # Extract text from the page
         page_data = extractor.extract(image_file)
         
-        # Check results and save to YAML
-        print("\n--- Extracted Data (YAML) ---")
-        yaml_output = yaml.dump(page_data, allow_unicode=True, default_flow_style=False, sort_keys=False)
-        print(yaml_output)
-        
-        # Save to file
-        output_yaml_path = Path(image_file).with_suffix('.yaml')
-        with open(output_yaml_path, 'w', encoding='utf-8') as f:
-            f.write(yaml_output)
-        print(f"Saved extracted data to {output_yaml_path}")
+        # Check results and save them as a sidecar next to the image
+        print("\n--- Extracted Data ---")
+        for data in page_data:
+            print(f"【Bubble {data['id'] + 1}】 {data['position']} {data['text']}")
+
+        output_path = Path(image_file).with_suffix(sidecar.SIDECAR_SUFFIX)
+        sidecar.write(output_path, page_data)
+        print(f"Saved extracted data to {output_path}")
             
     except Exception as e:
         print(f"An error occurred: {e}")
\ No newline at end of file
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+
+# Lengths of the character n-grams indexed. Japanese has no word boundaries, so every
+# bigram is indexed; single characters are indexed too so that one-character queries work.
+GRAM_SIZES = (1, 2)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bubbles (
+    id INTEGER PRIMARY KEY,
+    chapter TEXT NOT NULL,
+    page TEXT NOT NULL,
+    bubble INTEGER NOT NULL,
+    xmin INTEGER, ymin INTEGER, xmax INTEGER, ymax INTEGER,
+    text TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    UNIQUE (chapter, page, bubble)
+);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    bubble_id INTEGER NOT NULL REFERENCES bubbles(id) ON DELETE CASCADE,
+    PRIMARY KEY (gram, bubble_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS grams_bubble ON grams (bubble_id);
+"""
+
+
+def normalize(text):
+    """
+    Fold the variants OCR produces for the same text: full/half width forms, case and whitespace.
+    """
+    return "".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def ngrams(text):
+    """Set of the GRAM_SIZES n-grams of already normalized `text`"""
+    return {text[i:i + n] for n in GRAM_SIZES for i in range(len(text) - n + 1)}
+
+
+class TextIndex:
+    def __init__(self, db_path):
+        """
+        On-disk n-gram index of the recognized text of processed pages.
+
+        Every bubble is stored with its page and bounding box, and every n-gram of its text
+        points back to it. A query is answered by intersecting the bubbles of the query's
+        longest n-grams and then checking the candidates for the whole phrase.
+
+        Args:
+            db_path (str or Path): SQLite database file, created if missing.
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL this only risks the last transactions on power loss, never corruption
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def add_page(self, chapter, page, results):
+        """
+        Index the bubbles of one page, replacing whatever was indexed for it before.
+
+        Args:
+            chapter (str): Chapter (output directory name) the page belongs to.
+            page (str): Page file name.
+            results (list[dict]): Results as returned by MangaTextExtractor.extract.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bubbles WHERE chapter = ? AND page = ?", (chapter, page))
+            for item in results:
+                text = item.get("text") or ""
+                normalized = normalize(text)
+                xmin, ymin, xmax, ymax = item["position"]
+                cursor = self._conn.execute(
+                    "INSERT INTO bubbles (chapter, page, bubble, xmin, ymin, xmax, ymax, text, normalized) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (chapter, page, item["id"], xmin, ymin, xmax, ymax, text, normalized)
+                )
+                self._conn.executemany(
+                    "INSERT INTO grams (gram, bubble_id) VALUES (?, ?)",
+                    [(gram, cursor.lastrowid) for gram in ngrams(normalized)]
+                )
+
+    def remove_page(self, chapter, page):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bubbles WHERE chapter = ? AND page = ?", (chapter, page))
+
+    def remove_chapter(self, chapter):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bubbles WHERE chapter = ?", (chapter,))
+
+    def search(self, query, chapter=None, limit=50):
+        """
+        Find the bubbles whose text contains `query`.
+
+        Args:
+            query (str): Phrase to look for; compared after `normalize`.
+            chapter (str, optional): Only search this chapter.
+            limit (int): Maximum number of matches returned.
+
+        Returns:
+            list[dict]: Matches with chapter, page, bubble id, position and text, in page order.
+        """
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        # Every bubble containing the phrase contains all of its longest n-grams
+        n = min(len(normalized), max(GRAM_SIZES))
+        grams = sorted({normalized[i:i + n] for i in range(len(normalized) - n + 1)})
+        placeholders = ",".join("?" * len(grams))
+
+        sql = (
+            "SELECT b.chapter, b.page, b.bubble, b.xmin, b.ymin, b.xmax, b.ymax, b.text FROM bubbles b "
+            f"JOIN (SELECT bubble_id FROM grams WHERE gram IN ({placeholders}) "
+            "GROUP BY bubble_id HAVING COUNT(*) = ?) g ON g.bubble_id = b.id "
+            "WHERE instr(b.normalized, ?) > 0"
+        )
+        params = [*grams, len(grams), normalized]
+        if chapter is not None:
+            sql += " AND b.chapter = ?"
+            params.append(chapter)
+        sql += " ORDER BY b.chapter, b.page, b.bubble LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                "chapter": chapter_name,
+                "page": page,
+                "id": bubble,
+                "position": (xmin, ymin, xmax, ymax),
+                "text": text,
+            }
+            for chapter_name, page, bubble, xmin, ymin, xmax, ymax, text in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            bubbles, pages = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT chapter || '/' || page) FROM bubbles"
+            ).fetchone()
+        return {"bubbles": bubbles, "pages": pages}
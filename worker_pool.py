@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+import torch.multiprocessing
+
+# Extractor of the current worker process, set by _init_worker
+_worker_extractor = None
+
+
+def _init_worker(extractor, num_threads):
+    global _worker_extractor
+    # Split the cores between the workers instead of letting every worker use all of them
+    torch.set_num_threads(num_threads)
+    _worker_extractor = extractor
+
+
+def _extract_in_worker(source):
+    # Paths and encoded bytes are decoded here, so the page never crosses the process boundary as pixels
+    return _worker_extractor.extract(source)
+
+
+class ExtractorPool:
+    def __init__(self, extractor, workers=None):
+        """
+        Run a loaded MangaTextExtractor in several worker processes.
+
+        The model weights are moved to shared memory before the workers start, so every
+        worker maps the same tensors instead of loading its own copy (except for the packed
+        int8 Linear weights of the quantized backends, see MangaTextExtractor.share_memory).
+        Workers are spawned rather than forked, because forking a process whose torch thread
+        pool is already running can deadlock the children.
+
+        The workers run `_init_worker` and `_extract_in_worker` from this module. Spawning also
+        re-runs the script that started the process under the name "__mp_main__", so that script
+        must not set anything up when imported under that name.
+
+        Args:
+            extractor (MangaTextExtractor): Extractor with the models already loaded.
+            workers (int, optional): Number of worker processes. Defaults to half the CPU cores.
+        """
+        cpu_count = os.cpu_count() or 1
+        self.workers = workers or max(1, cpu_count // 2)
+        num_threads = max(1, cpu_count // self.workers)
+
+        shared_bytes, copied_bytes = extractor.share_memory()
+        if copied_bytes:
+            print(f"Sharing {shared_bytes / 2**20:.0f} MB of weights; {copied_bytes / 2**20:.0f} MB of int8 weights "
+                  f"are copied into each worker")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=torch.multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(extractor, num_threads),
+        )
+        print(f"Started {self.workers} extractor process(es) with {num_threads} thread(s) each")
+
+    def extract(self, page):
+        """
+        Detect and recognize one page in a worker process; blocks until it is done.
+
+        Args:
+            page (PageInput): Page to process. In-memory pages are sent as their encoded bytes.
+
+        Returns:
+            list[dict]: Same as MangaTextExtractor.extract.
+        """
+        source = str(page.path) if page.path is not None else page.read_bytes()
+        return self._executor.submit(_extract_in_worker, source).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)